@@ -33,7 +33,11 @@ sidebar = html.Div(
 )
 
 app.layout = html.Div([
-    dcc.Store(id='shared-data', data={"ボード": None, "ピース": [], "ピース枚数": [], "結果": None, "結果文字": "", "resule_summary": ""}, storage_type="session"),
+    # 表示する欄が自分の見るものだけに反応するよう、ボード・ピース・結果を別々の Store に持つ
+    dcc.Store(id='board-data', data=None, storage_type="session"),
+    dcc.Store(id='piece-data', data=[], storage_type="session"),
+    # 結果そのものはサーバー側の RESULT_CACHE に置き、セッションにはそのキーだけを持つ
+    dcc.Store(id='shared-data', data={"ピース枚数": [], "結果キー": None, "結果文字": ""}, storage_type="session"),
     sidebar,
     html.Div(
         [dash.page_container],
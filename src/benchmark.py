@@ -0,0 +1,232 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from pages.autotune import time_to_solution
+from pages.incidence import Incidence
+from pages.piece import Piece
+from pages.solver import Solver
+
+# test_solver.py と同じ問題
+INSTANCES = {
+    "3x3": ([[0, 0, 0], [0, 0, 0], [0, 0, 0]], [[[1, 1], [0, 1]], [[1, 1, 1]]], [2, 1]),
+    "4x4": (
+        [[0, 0, 0, 0], [0, None, None, 0], [0, None, 0, 0], [0, 0, 0, 0]],
+        [[[1, 1]], [[1, 1, 1, 1], [0, 1, 0, 0]], [[1, 1, 1], [0, 0, 1]], [[1, 1, 1], [0, 0, 1], [0, 0, 1]]],
+        [2, 1, 1, 1],
+    ),
+    "10x10": (
+        [
+            [None, None, None, 0, 0, 0, 0, None, None, None], [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+            [None, None, None, 0, 0, 0, 0, None, None, None], [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+            [None, 0, 0, 0, 0, 0, 0, 0, 0, None], [None, 0, 0, 0, 0, 0, 0, 0, 0, None],
+            [None, 0, 0, 0, 0, 0, 0, 0, 0, None],
+        ],
+        [
+            [[1]], [[1, 1]], [[1, 1, 1]], [[1, 1], [0, 1]],
+            [[1, 1, 1], [1, 0, 0]], [[1, 1, 1], [0, 1, 1]], [[0, 1, 1], [1, 1, 1]], [[1, 0, 0], [1, 0, 0], [1, 1, 1]],
+            [[1, 1, 1], [1, 0, 1], [1, 0, 1]], [[1, 1, 1], [1, 1, 0], [1, 1, 0]], [[1, 1, 1], [1, 1, 1], [1, 0, 0], [1, 1, 1]],
+            [[1, 1, 1, 1], [0, 0, 1, 1], [0, 0, 0, 1]], [[1, 1, 1, 1], [1, 1, 1, 1], [0, 0, 0, 1], [0, 0, 0, 1]],
+            [[1, 1, 1, 1, 1], [1, 0, 0, 0, 0], [1, 0, 0, 0, 0]],
+        ],
+        [1, 1, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+    ),
+}
+
+PIECES = [[[1, 1, 1], [1, 0, 0]], [[1, 1, 1], [0, 1, 1]], [[1, 0, 0], [1, 0, 0], [1, 1, 1]], [[1, 1, 1, 1, 1]]]
+
+# ベースラインより遅くなったとみなす比率の既定値
+DEFAULT_TOLERANCE = 1.2
+
+# これより小さい差はタイマーの揺れとみなして比べない [s]
+MIN_DELTA_S = 0.005
+
+# ベースラインと比べる項目（値が大きいほど悪いもの）
+TIMED_METRICS = ["build_s", "bqm_s", "evaluate_s", "tts99_s", "exact_s"]
+
+
+def best_time(fn, repeat):
+    """fn を repeat 回呼び、最後の戻り値と最短の時間を返す"""
+    elapsed = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    return result, elapsed
+
+
+def generate_instance(seed, rows, cols, wall_density=0.1, pieces=PIECES, slack=0):
+    """必ず解のある問題を乱数で作り、(盤面, ピース, 使用上限) を返す
+
+    壁を wall_density の割合で置いたあと、左上から順に空きセルへ乱数で選んだピースの向きを当てはめていき、
+    どれも入らなかったセルは壁にする。当てはめた枚数に slack を足したものを使用上限とする。
+    """
+    rng = random.Random(seed)
+    grid = [[None if rng.random() < wall_density else 0 for _ in range(cols)] for _ in range(rows)]
+    filled = [[cell is None for cell in row] for row in grid]
+    variations = [(k, v) for k, piece in enumerate(Piece(g) for g in pieces) for v in piece.variations]
+    counts = [0] * len(pieces)
+
+    for r in range(rows):
+        for c in range(cols):
+            if filled[r][c]:
+                continue
+            rng.shuffle(variations)
+            for k, shape in variations:
+                # 向きの最初のセル（行優先）を (r, c) に合わせる
+                anchor = next(pc for pc, v in enumerate(shape[0]) if v == 1)
+                cells = [(r + pr, c + pc - anchor) for pr, row in enumerate(shape) for pc, v in enumerate(row) if v == 1]
+                if all(0 <= cr < rows and 0 <= cc < cols and not filled[cr][cc] for cr, cc in cells):
+                    for cr, cc in cells:
+                        filled[cr][cc] = True
+                    counts[k] += 1
+                    break
+            else:
+                grid[r][c] = None
+                filled[r][c] = True
+
+    used = [k for k, n in enumerate(counts) if n > 0]
+    return grid, [pieces[k] for k in used], [counts[k] + slack for k in used]
+
+
+def bench_instance(board_grid, pieces, limits, num_reads, sampler="neal", seed=0, repeat=3):
+    """1つの問題について、段階ごとの時間と BQM の大きさ・成功確率・TTS99 を測る（読み出し以外は repeat 回の最短）"""
+    piece_ids = list(range(1, len(pieces) + 1))
+    solver, build_s = best_time(lambda: Solver(board_grid, pieces, piece_ids, limits, presolve=True), repeat)
+
+    def build_bqm():
+        solver.parts = None
+        return solver.build_bqm()
+
+    bqm, bqm_s = best_time(build_bqm, repeat)
+
+    batch_sampler = solver.make_sampler(sampler)
+    start = time.perf_counter()
+    sampleset = batch_sampler.sample(num_reads, seed=seed)
+    sample_s = time.perf_counter() - start
+
+    statuses, evaluate_s = best_time(lambda: solver.evaluate(solver.sample_matrix(sampleset)), repeat)
+    (exact_status, _, nodes), exact_s = best_time(solver.search_exact, repeat)
+
+    success = statuses.count("成功") / num_reads
+    tts = time_to_solution(sample_s / num_reads, success)
+    return {
+        "cells": len(solver.cell_index),
+        "placements": len(solver.placements),
+        "variables": bqm.num_variables,
+        "interactions": bqm.num_interactions,
+        "build_s": build_s,
+        "bqm_s": bqm_s,
+        "reads_per_s": num_reads / sample_s if sample_s > 0 else None,
+        "evaluate_s": evaluate_s,
+        "success_probability": success,
+        "tts99_s": tts if tts != float("inf") else None,
+        "exact_status": exact_status,
+        "exact_nodes": nodes,
+        "exact_s": exact_s,
+    }
+
+
+def bench_suite(names, generated, rows, cols, wall_density, num_reads, sampler="neal", seed=0):
+    """既存の問題と乱数で作った問題をまとめて計測し、JSON にできる辞書を返す"""
+    instances = {name: INSTANCES[name] for name in names}
+    for i in range(generated):
+        instances[f"gen{rows}x{cols}-{seed + i}"] = generate_instance(seed + i, rows, cols, wall_density)
+    results = {}
+    for name, (board_grid, pieces, limits) in instances.items():
+        results[name] = bench_instance(board_grid, pieces, limits, num_reads, sampler=sampler, seed=seed)
+        print(f"{name}: {json.dumps(results[name], ensure_ascii=False)}", file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(), "sampler": sampler, "num_reads": num_reads, "seed": seed,
+            "wall_density": wall_density,
+        },
+        "instances": results,
+    }
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE, min_delta=MIN_DELTA_S):
+    """ベースラインより tolerance 倍かつ min_delta 秒を超えて遅くなった (問題, 項目, 今回, 基準) の一覧を返す"""
+    regressions = []
+    for name, metrics in report["instances"].items():
+        base = baseline["instances"].get(name)
+        if base is None:
+            continue
+        for metric in TIMED_METRICS:
+            now, before = metrics.get(metric), base.get(metric)
+            if now is None or before is None or before <= 0:
+                continue
+            if now > before * tolerance and now - before > min_delta:
+                regressions.append((name, metric, now, before))
+    return regressions
+
+
+def bench_incidence(sizes, repeat=5):
+    """盤面を大きくしながら接続関係の構築時間を測り、配置候補数あたりの時間が一定であることを確かめる"""
+    print(f"{'board':>8} {'placements':>11} {'build[ms]':>10} {'per placement[us]':>18}")
+    for n in sizes:
+        solver = Solver([[0] * n for _ in range(n)], PIECES, list(range(1, len(PIECES) + 1)), [1] * len(PIECES))
+        placement_cells = [[solver.cell_index[cell] for cell in v.cells] for v in solver.placements]
+        elapsed = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            Incidence.from_lists(placement_cells, len(solver.cell_index))
+            elapsed = min(elapsed, time.perf_counter() - start)
+        num_placements = len(placement_cells)
+        print(f"{n:>4}x{n:<3} {num_placements:>11} {elapsed * 1e3:>10.2f} {elapsed / num_placements * 1e6:>18.3f}")
+
+
+def bench_samplers(names, num_reads, seed=0):
+    """neal と ExactCoverAnnealer を同じ読み出し数で走らせ、速度と成功率を比べる"""
+    print(f"{'instance':>8} {'sampler':>12} {'reads':>6} {'time[s]':>8} {'reads/s':>8} {'success':>8}")
+    for name in names:
+        board_grid, pieces, limits = INSTANCES[name]
+        solver = Solver(board_grid, pieces, list(range(1, len(pieces) + 1)), limits)
+        for sampler in ("neal", "exact_cover"):
+            start = time.perf_counter()
+            solver.run(num_reads, early_stop=False, seed=seed, sampler=sampler)
+            elapsed = time.perf_counter() - start
+            success = solver.results.status_counts()["成功"] / solver.results.total
+            print(f"{name:>8} {sampler:>12} {num_reads:>6} {elapsed:>8.2f} {num_reads / elapsed:>8.1f} {success:>8.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ポリオミノ配置探索のベンチマーク")
+    parser.add_argument("target", choices=["incidence", "samplers", "suite"], help="計測対象")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 20, 40, 80], help="盤面の一辺の長さ")
+    parser.add_argument("--instances", nargs="+", default=list(INSTANCES), help="samplers・suite で使う問題")
+    parser.add_argument("--num-reads", type=int, default=100, help="samplers・suite での読み出し数")
+    parser.add_argument("--sampler", choices=["neal", "exact_cover"], default="neal", help="suite で使うサンプラー")
+    parser.add_argument("--generated", type=int, default=3, help="suite で乱数から作る問題の数")
+    parser.add_argument("--rows", type=int, default=6, help="乱数で作る盤面の行数")
+    parser.add_argument("--cols", type=int, default=6, help="乱数で作る盤面の列数")
+    parser.add_argument("--wall-density", type=float, default=0.1, help="乱数で作る盤面の壁の割合")
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    parser.add_argument("--output", help="suite の結果を書き出す JSON ファイル")
+    parser.add_argument("--baseline", help="suite の結果と比べる JSON ファイル")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="遅くなったとみなす比率")
+    args = parser.parse_args()
+
+    if args.target == "incidence":
+        bench_incidence(args.sizes)
+    elif args.target == "samplers":
+        bench_samplers(args.instances, args.num_reads)
+    elif args.target == "suite":
+        report = bench_suite(args.instances, args.generated, args.rows, args.cols, args.wall_density,
+                             args.num_reads, sampler=args.sampler, seed=args.seed)
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            print(text)
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as f:
+                regressions = compare(report, json.load(f), args.tolerance)
+            for name, metric, now, before in regressions:
+                print(f"遅くなった: {name} {metric} {before:.4f}s -> {now:.4f}s", file=sys.stderr)
+            sys.exit(1 if regressions else 0)
@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from pages.solver import solve_regions
+
+# 1行の例:
+# {"id": "a", "board": [[0, 0], [0, 0]], "pieces": [[[1, 1]]], "limits": [2], "num_reads": 50,
+#  "options": {"engine": "auto", "seed": 0}}
+# piece_ids を省くと 1, 2, ... を振る。options は solve() のキーワード引数としてそのまま渡す。
+
+
+def instance_key(instance_id):
+    """出力済みの id と照らし合わせるためのキー（1 と "1" を区別する）"""
+    return json.dumps(instance_id)
+
+
+def read_instances(lines):
+    """JSONL を1行ずつ読み、(id, 問題) を返す。id の無い行は行番号を id にする
+
+    読めない行（JSON のオブジェクトでない行）は、問題の代わりにその例外を行番号と返す。
+    1行の誤りで残りの問題を止めず、その行は solve_instance() がエラーとして出力する。
+    """
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            instance = json.loads(line)
+            if not isinstance(instance, dict):
+                raise ValueError("問題は JSON のオブジェクトで書いてください")
+        except ValueError as e:
+            yield line_no, e
+            continue
+        yield instance.get("id", line_no), instance
+
+
+def completed_ids(path):
+    """途中まで書かれた出力ファイルから、書き終わった問題の id を集める
+
+    最後の行が改行で終わっていなければ（書き込みの途中で止まった）その行を切り詰める。
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    return {instance_key(json.loads(line)["id"]) for line in data[:end].decode("utf-8").splitlines() if line.strip()}
+
+
+def solve_instance(instance_id, instance, num_reads):
+    """1問を解き、出力する1行分の辞書を返す（例外も結果として返す）"""
+    started = time.perf_counter()
+    try:
+        if isinstance(instance, Exception):
+            raise instance
+        pieces = instance["pieces"]
+        piece_ids = instance.get("piece_ids") or list(range(1, len(pieces) + 1))
+        status, grid, summary = solve_regions(
+            instance["board"], pieces, piece_ids, instance["limits"], instance.get("num_reads", num_reads),
+            **instance.get("options", {})
+        )
+        result = {"id": instance_id, "status": status, "grid": grid, "summary": json.loads(summary)}
+    except Exception as e:
+        result = {"id": instance_id, "status": "エラー", "error": f"{type(e).__name__}: {e}"}
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def run(lines, out, num_reads=100, workers=None, max_in_flight=None, skip=frozenset()):
+    """問題を解き、終わった順に1行ずつ out に書く。書いた行数を返す
+
+    入力は必要な分だけ読み、同時に抱える問題は max_in_flight 件（既定は workers の2倍）までにするので、
+    入力がどれだけ長くてもメモリは増えない。skip にキーがある問題は飛ばす。
+    """
+    written = 0
+
+    def emit(result):
+        nonlocal written
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+        written += 1
+
+    pending_instances = (
+        (instance_id, instance) for instance_id, instance in read_instances(lines)
+        if instance_key(instance_id) not in skip
+    )
+    if not workers or workers <= 1:
+        for instance_id, instance in pending_instances:
+            emit(solve_instance(instance_id, instance, num_reads))
+        return written
+
+    max_in_flight = max_in_flight or 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        try:
+            for instance_id, instance in pending_instances:
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        emit(future.result())
+                in_flight.add(pool.submit(solve_instance, instance_id, instance, num_reads))
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    emit(future.result())
+        finally:
+            for future in in_flight:
+                future.cancel()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ポリオミノ配置探索を JSONL の問題に対してまとめて実行する")
+    parser.add_argument("input", nargs="?", default="-", help="問題の JSONL ファイル（省略か - で標準入力）")
+    parser.add_argument("-o", "--output", help="結果の JSONL ファイル（省略すると標準出力）")
+    parser.add_argument("--resume", action="store_true", help="出力ファイルに書き終わった問題を飛ばして追記する")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="並列に解くプロセス数")
+    parser.add_argument("--max-in-flight", type=int, help="同時に抱える問題の数（既定は workers の2倍）")
+    parser.add_argument("--num-reads", type=int, default=100, help="問題に num_reads が無いときの読み出し数")
+    args = parser.parse_args(argv)
+
+    skip = completed_ids(args.output) if args.resume and args.output else frozenset()
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = open(args.output, "a" if args.resume else "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        written = run(source, out, num_reads=args.num_reads, workers=args.workers,
+                      max_in_flight=args.max_in_flight, skip=skip)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    print(f"{written} 件を解きました（{len(skip)} 件は出力済み）", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 import dash
 import dash_bootstrap_components as dbc
-import json
 
-from dash import html, dcc, Input, Output, State, callback_context
+from dash import html, dcc, Input, Output, State
+from .codec import encode_board
+from .figures import board_figure, graph, toggle_cell_js
 
 
 dash.register_page(__name__, path="/define-board", name="ボードの定義ページ", title="ボードの定義ページ")
@@ -54,28 +55,8 @@ layout = html.Div(
 
 
 def _render_grid(grid):
-    """grid (2D list of 0 or None) を Div のグリッドとしてレンダリングする"""
-    rows = []
-    for r, row in enumerate(grid):
-        cells = []
-        for c, val in enumerate(row):
-            is_blocked = val is None
-            cells.append(
-                html.Div(
-                    id={"type": "board-cell", "index": f"{r}-{c}"},
-                    n_clicks=0,
-                    style={
-                        "width": "40px",
-                        "height": "40px",
-                        "backgroundColor": "#222" if is_blocked else "#fff",
-                        "border": "1px solid #aaa",
-                        "cursor": "pointer",
-                        "boxSizing": "border-box",
-                    },
-                )
-            )
-        rows.append(html.Div(children=cells, style={"display": "flex"}))
-    return html.Div(children=rows)
+    """grid (2D list of 0 or None) を1枚の図としてレンダリングする（セルのクリックはクライアント側で切り替える）"""
+    return graph(board_figure(grid), id="board-figure")
 
 
 @dash.callback(
@@ -93,46 +74,30 @@ def generate_grid(_n_clicks, rows, cols):
     return _render_grid(grid), grid
 
 
-@dash.callback(
-    Output("board-grid", "children", allow_duplicate=True),
+# セルをクリックするたびにサーバーへ問い合わせないよう、図とグリッドの状態はブラウザの中で書き換える
+dash.clientside_callback(
+    toggle_cell_js(0, None),
+    Output("board-figure", "figure"),
     Output("board-grid-state", "data", allow_duplicate=True),
-    Input({"type": "board-cell", "index": dash.ALL}, "n_clicks"),
+    Input("board-figure", "clickData"),
+    State("board-figure", "figure"),
     State("board-grid-state", "data"),
     prevent_initial_call=True,
 )
-def toggle_cell(_n_clicks_list, grid):
-    ctx = callback_context
-    if not ctx.triggered or not grid:
-        return dash.no_update, dash.no_update
-
-    triggered_id_str = ctx.triggered[0]["prop_id"].split(".")[0]
-    triggered_id = json.loads(triggered_id_str)
-    if triggered_id["type"] != "board-cell":
-        return dash.no_update, dash.no_update
-
-    r_str, c_str = triggered_id["index"].split("-")
-    r, c = int(r_str), int(c_str)
-
-    current_val = grid[r][c]
-    grid[r][c] = None if current_val == 0 else 0
-
-    return _render_grid(grid), grid
 
 
 @dash.callback(
     Output("validation-message", "children"),
     Output("redirect-to-home", "pathname"),
-    Output("shared-data", "data", allow_duplicate=True),
+    Output("board-data", "data", allow_duplicate=True),
     Input("set-board-button", "n_clicks"),
     State("board-grid-state", "data"),
-    State("shared-data", "data"),
     prevent_initial_call=True,
 )
-def save_board(n_clicks, grid, store):
+def save_board(n_clicks, grid):
     if n_clicks == 0:
-        return dash.no_update, dash.no_update, store
+        return dash.no_update, dash.no_update, dash.no_update
     if not grid:
-        return "エラー: グリッドが生成されていません。", dash.no_update, store
+        return "エラー: グリッドが生成されていません。", dash.no_update, dash.no_update
 
-    store["ボード"] = json.dumps(grid)
-    return "", "/", store
+    return "", "/", encode_board(grid)
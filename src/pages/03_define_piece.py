@@ -1,9 +1,9 @@
 import dash
 import dash_bootstrap_components as dbc
-import json
 
-from dash import html, dcc, Input, Output, State, callback_context
-from .piece import Piece
+from dash import html, dcc, Input, Output, State
+from .codec import piece_key
+from .figures import PIECE_LIST_STYLE, graph, piece_figure, piece_item, toggle_cell_js
 
 
 dash.register_page(__name__, path="/define-piece", name="ピースの定義ページ", title="ピースの定義ページ")
@@ -64,7 +64,7 @@ layout = html.Div(
                     html.Div(
                         [
                             html.H1("定義したピースの一覧"),
-                            html.Div(children=[], id="piece-display-area-sub", style={"textAlign": "center"}),
+                            html.Div(children=[], id="piece-display-area-sub", style=PIECE_LIST_STYLE),
                         ]
                     ),
                     md=6,
@@ -76,56 +76,13 @@ layout = html.Div(
 
 
 def _render_piece_grid(grid, color="#4A90D9"):
-    """grid (2D list of 0 or 1) をクリック可能な Div グリッドとしてレンダリングする"""
-    rows = []
-    for r, row in enumerate(grid):
-        cells = []
-        for c, val in enumerate(row):
-            is_filled = val == 1
-            cells.append(
-                html.Div(
-                    id={"type": "piece-cell", "index": f"{r}-{c}"},
-                    n_clicks=0,
-                    style={
-                        "width": "40px",
-                        "height": "40px",
-                        "backgroundColor": color if is_filled else "#fff",
-                        "border": "1px solid #aaa",
-                        "cursor": "pointer",
-                        "boxSizing": "border-box",
-                    },
-                )
-            )
-        rows.append(html.Div(children=cells, style={"display": "flex"}))
-    return html.Div(children=rows)
+    """grid (2D list of 0 or 1) を1枚の図としてレンダリングする（セルのクリックはクライアント側で切り替える）"""
+    return graph(piece_figure(grid, color), id="piece-figure")
 
 
 def _render_piece_list(pieces):
-    """保存済みピースのリストを表示用 Div として返す"""
-    piece_display = []
-    for piece in pieces:
-        grid = json.loads(piece[0])
-        color = piece[1]
-        rows = []
-        for row in grid:
-            cells = []
-            for cell_value in row:
-                cell_color = color if cell_value == 1 else "white"
-                cells.append(
-                    html.Div(
-                        style={
-                            "width": "30px",
-                            "height": "30px",
-                            "backgroundColor": cell_color,
-                            "border": "1px solid #eee",
-                        }
-                    )
-                )
-            rows.append(html.Div(style={"display": "flex", "justifyContent": "center"}, children=cells))
-        piece_display.append(
-            html.Div(style={"display": "flex", "flexDirection": "column", "margin": "10px"}, children=rows)
-        )
-    return html.Div(children=piece_display, style={"display": "flex", "flexWrap": "wrap", "justifyContent": "center"})
+    """保存済みピースのリストを、一覧の欄の子要素のリストとして返す"""
+    return [piece_item(i, key) for i, key in enumerate(pieces)]
 
 
 @dash.callback(
@@ -143,57 +100,56 @@ def generate_piece_grid(_n_clicks, rows, cols):
     return _render_piece_grid(grid), grid
 
 
-@dash.callback(
-    Output("piece-grid", "children", allow_duplicate=True),
+dash.clientside_callback(
+    toggle_cell_js(0, 1),
+    Output("piece-figure", "figure"),
     Output("piece-grid-state", "data", allow_duplicate=True),
-    Input({"type": "piece-cell", "index": dash.ALL}, "n_clicks"),
+    Input("piece-figure", "clickData"),
+    State("piece-figure", "figure"),
     State("piece-grid-state", "data"),
     prevent_initial_call=True,
 )
-def toggle_piece_cell(_n_clicks_list, grid):
-    ctx = callback_context
-    if not ctx.triggered or not grid:
-        return dash.no_update, dash.no_update
 
-    triggered_id_str = ctx.triggered[0]["prop_id"].split(".")[0]
-    triggered_id = json.loads(triggered_id_str)
-    if triggered_id["type"] != "piece-cell":
-        return dash.no_update, dash.no_update
 
-    r_str, c_str = triggered_id["index"].split("-")
-    r, c = int(r_str), int(c_str)
-
-    grid[r][c] = 0 if grid[r][c] == 1 else 1
-
-    return _render_piece_grid(grid), grid
+@dash.callback(
+    Output("piece-display-area-sub", "children"),
+    Input("piece-display-area-sub", "id"),
+    State("piece-data", "data"),
+)
+def show_piece_list(_id, pieces):
+    """ページを開いたときに一覧を描く（以降の追加は add_piece が差分だけを送る）"""
+    if not pieces:
+        return [html.Div("表示するピースがありません。")]
+    return _render_piece_list(pieces)
 
 
 @dash.callback(
-    Output("piece-display-area-sub", "children"),
+    Output("piece-display-area-sub", "children", allow_duplicate=True),
     Output("piece-validation-message", "children"),
-    Output("shared-data", "data", allow_duplicate=True),
+    Output("piece-data", "data", allow_duplicate=True),
     Input("add-piece-button", "n_clicks"),
     State("piece-grid-state", "data"),
-    State("shared-data", "data"),
+    State("piece-data", "data"),
     prevent_initial_call=True,
 )
-def add_piece(_n_clicks, grid, store):
-    pieces = [tuple(p) for p in store["ピース"]]
-
+def add_piece(_n_clicks, grid, pieces):
     if not grid:
-        if not pieces:
-            return html.Div("表示するピースがありません。"), "", store
-        return _render_piece_list(pieces), "", store
+        return dash.no_update, "", dash.no_update
 
     # 1が一つもない場合はエラー
     flat = [v for row in grid for v in row]
     if all(v == 0 for v in flat):
-        return _render_piece_list(pieces), "エラー: ミノが選択されていません。", store
-
-    piece = Piece([[str(v) for v in row] for row in grid])
-    dumped = piece.dump()
-    if dumped not in pieces:
-        pieces.append(dumped)
-    store["ピース"] = list(pieces)
-
-    return _render_piece_list(pieces), "", store
+        return dash.no_update, "エラー: ミノが選択されていません。", dash.no_update
+
+    key = piece_key(grid)
+    if key in pieces:
+        return dash.no_update, "", dash.no_update
+    if not pieces:
+        return _render_piece_list([key]), "", [key]
+
+    # 一覧と Store には増えた1つだけを付け足す
+    display = dash.Patch()
+    display.append(piece_item(len(pieces), key))
+    stored = dash.Patch()
+    stored.append(key)
+    return display, "", stored
@@ -1,12 +1,18 @@
 import dash
-import json
 import dash_bootstrap_components as dbc
 
 from dash import html, Input, Output, State, dcc
-from .solver import solve
+from .codec import decode_board, decode_result, encode_result, piece_shape
+from .figures import piece_list, render_board
+from .jobs import JobManager, JobRejected
+from .result_cache import RESULT_CACHE
+from .solver import MODEL_CACHE, solve_regions
 
 dash.register_page(__name__, path="/annealing", name="シミュレーションアニーリング法", title="シミュレーションアニーリング法")
 
+# 求解はリクエストの中では行わず、このジョブ管理に投げて状態をポーリングする
+JOBS = JobManager(max_workers=2, max_queued=4)
+
 board_display = dbc.Col(
     html.Div(
         children = [
@@ -54,6 +60,8 @@ H = coef_use  × Σ_i ( Σ_k x_{i,k} − limit_i )²
 → `coef_fill` を大きくすると「空きやはみ出しを出さないこと」が優先される。
 
 両係数のバランスが解の質に影響します。充填制約を強くするのが基本です。
+「自動で調整する」を選ぶと、読み出しの一部で候補の設定を少しずつ試して成功までの時間が短いものに絞り込み、
+残りの読み出しをその設定で行います。選んだ設定は似た大きさの問題のために保存されます。
             """,
             style={"fontSize": "0.9em"}
         ),
@@ -64,6 +72,21 @@ H = coef_use  × Σ_i ( Σ_k x_{i,k} − limit_i )²
 
 run_button_row = dbc.Col([
     dbc.Row(dbc.Input(id="num_reads", type="number", placeholder="探索の回数", style={"margin": "5px"})),
+    dbc.Row(dbc.Input(id="max-solutions", type="number", min=0,
+                      placeholder="集める異なる解の数（空欄なら最初の解で終える）", style={"margin": "5px"})),
+    dbc.Row([
+        dbc.Label("探索エンジン", className="mt-3"),
+        dbc.RadioItems(
+            id="engine",
+            options=[
+                {"label": "自動（小さな盤面は厳密探索）", "value": "auto"},
+                {"label": "焼きなまし", "value": "anneal"},
+                {"label": "厳密探索（Algorithm X）", "value": "exact"},
+            ],
+            value="auto",
+            inline=True,
+        ),
+    ]),
     dbc.Row([
         dbc.Label("coef_use — 使用数制約の係数", className="mt-3"),
         dcc.Slider(id="coef-use", min=1, max=50, step=1, value=10,
@@ -76,16 +99,32 @@ run_button_row = dbc.Col([
                    marks={1: "1", 10: "10", 25: "25", 50: "50"},
                    tooltip={"placement": "bottom", "always_visible": True}),
     ]),
+    dbc.Row(
+        dbc.Checklist(
+            id="auto-tune-check",
+            options=[{"label": "係数・スイープ数を自動で調整する（スライダーの値は使わない）", "value": "tune"}],
+            value=[],
+            className="mt-3",
+            inline=True,
+        )
+    ),
     dbc.Row(
         dbc.Checklist(
             id="early-stop-check",
-            options=[{"label": "成功した時点で探索を打ち切る", "value": "early_stop"}],
-            value=["early_stop"],
+            options=[
+                {"label": "成功した時点で探索を打ち切る", "value": "early_stop"},
+                {"label": "段階ごとの時間を計測する", "value": "profile"},
+                {"label": "前回の結果から始める", "value": "warm_start"},
+            ],
+            value=["early_stop", "warm_start"],
             className="mt-3",
             inline=True,
         )
     ),
-    dbc.Row(dbc.Button("実行", id="run-solver", color="primary", n_clicks=0, className="mt-3"))],
+    dbc.Row(dbc.Button("実行", id="run-solver", color="primary", n_clicks=0, className="mt-3")),
+    dbc.Row(dbc.Button("中止", id="cancel-solver", color="danger", outline=True, n_clicks=0, className="mt-2")),
+    dbc.Row(html.Div(id="solver-job-status", className="mt-2")),
+    dbc.Row(html.Small(id="model-cache-stats", className="text-muted mt-2"))],
     width={"size": 6, "offset": 3}, className="text-center mt-4"
 )
 
@@ -96,111 +135,134 @@ layout = html.Div(
         dbc.Row([board_display, piece_display]),
         dbc.Row(dbc.Col(objective_card, width={"size": 8, "offset": 2})),
         dbc.Row(run_button_row),
-        dcc.Loading(dcc.Location(id="redirect-to-result", refresh=True), type="circle")
+        dcc.Store(id="solver-job-id", data=None),
+        dcc.Interval(id="solver-job-poll", interval=500, disabled=True),
+        dcc.Location(id="redirect-to-result", refresh=True)
     ],
     style={"color": "#333", "justifyContent": "center"})
 
 @dash.callback(
     Output("board-display-area-annealing", "children"),
-    Input("shared-data", "data"),
+    Input("board-data", "data"),
 )
-def show_board_display(store):
-    if store["ボード"] is None:
-        return html.P("まだボードは定義されていません。", style={"color": "#777"})
-    board_data_json = store["ボード"]
-    try:
-        board = json.loads(board_data_json)
-    except json.JSONDecodeError:
-        return html.P("ボードデータの解析に失敗しました。", style={"color": "red"})
-
-    if not isinstance(board, list) or not all(isinstance(row, list) for row in board):
-        return html.P("無効なボードデータ形式です。", style={"color": "red"})
-
-    rows = []
-    for row in board:
-        cells = []
-        for cell_value in row:
-            cell_color = "white" if cell_value == 0 else "black"
-            cell_style = {
-                "width": "30px", 
-                "height": "30px",
-                "backgroundColor": cell_color,
-                "border": "1px solid #eee",
-                "display": "flex",
-                "color": "#333" if cell_color == "white" else "#eee"
-            }
-            cells.append(html.Div(style=cell_style))
-        rows.append(html.Div(style={"display": "flex"}, children=cells))
-
-    return html.Div(children=rows)
+def show_board_display(board_data):
+    return render_board(board_data, cell_size=30)
 
 @dash.callback(
     Output("piece-display-area-annealing", "children"),
-    Input("shared-data", "data"),
+    Input("piece-data", "data"),
+    State("shared-data", "data"),
 )
-def show_piece_display(store):
-    if len(store["ピース"]) == 0:
+def show_piece_display(pieces, store):
+    if not pieces:
         return html.P("まだピースは定義されていません。", style={"color": "#777"})
 
-    pieces = [tuple(p) for p in store["ピース"]]
     saved_nums = store.get("ピース枚数") or []
-    piece_display = []
-    for piece_id, piece in enumerate(pieces):
-        rows = []
-        grid = json.loads(piece[0])
-        color = piece[1]
-        for row in grid:
-            cells = []
-            for cell_value in row:
-                if cell_value == 1:
-                    cell_color = color
-                else:
-                    cell_color = "white"
-                cell_style = {
-                    "width": "30px",
-                    "height": "30px",
-                    "backgroundColor": cell_color,
-                    "border": "1px solid #eee",
-                    "display": "flex",
-                    "color": "#333" if cell_color == "white" else "#eee"
-                }
-                cells.append(html.Div(style=cell_style))
-            rows.append(html.Div(style={"display": "flex", "justifyContent": "center"}, children=cells))
+
+    def piece_num_input(piece_id):
         saved_value = saved_nums[piece_id] if piece_id < len(saved_nums) else 1
-        rows.append(
-            dbc.Input(
-                id={"type": "piece-num", "index": piece_id}, value=saved_value,
-                type="number", placeholder="使えるピースの数", style={"margin": "5px"}
-            )
+        return dbc.Input(
+            id={"type": "piece-num", "index": piece_id}, value=saved_value,
+            type="number", placeholder="使えるピースの数", style={"margin": "5px"}
         )
-        piece_display.append(
-            html.Div(style={"display": "flex", "flex-direction": "column", "margin": "10px"},
-                     children=rows))
 
-    return html.Div(children=piece_display)
+    return piece_list(pieces, footer=piece_num_input)
 
 @dash.callback(
-    Output("redirect-to-result", "pathname"), Output("shared-data", "data", allow_duplicate=True),
+    Output("model-cache-stats", "children"),
+    Input("shared-data", "data"),
+)
+def show_model_cache_stats(_store):
+    stats = MODEL_CACHE.stats()
+    return (f"モデルキャッシュ: ヒット {stats['hits']} / ミス {stats['misses']} / 破棄 {stats['evictions']}"
+            f" （{stats['entries']} 件, {stats['nbytes'] / 1024 / 1024:.1f} MB）")
+
+@dash.callback(
+    Output("solver-job-id", "data"), Output("solver-job-poll", "disabled"),
+    Output("solver-job-status", "children"),
     Input("run-solver", "n_clicks"),
-    State("shared-data", "data"), State({"type": "piece-num", "index": dash.ALL}, "value"),
+    State("board-data", "data"), State("piece-data", "data"), State("shared-data", "data"),
+    State({"type": "piece-num", "index": dash.ALL}, "value"),
     State("num_reads", "value"), State("coef-use", "value"), State("coef-fill", "value"),
-    State("early-stop-check", "value"),
+    State("early-stop-check", "value"), State("engine", "value"), State("auto-tune-check", "value"),
+    State("max-solutions", "value"),
     prevent_initial_call=True
 )
-def run_solver(n_clicks, store, piece_nums, num_reads, coef_use, coef_fill, early_stop_value):
+def run_solver(n_clicks, board_data, piece_data, store, piece_nums, num_reads, coef_use, coef_fill, early_stop_value,
+               engine, tune_value, max_solutions):
     if n_clicks == 0 or num_reads is None or num_reads <= 0:
-        return "/annealing", store
-    board = json.loads(store["ボード"])
-    piece_data = store["ピース"]
-    pieces = [json.loads(d[0]) for d in piece_data]
+        return dash.no_update, dash.no_update, dash.no_update
+    board = decode_board(board_data)
+    pieces = [piece_shape(key) for key in piece_data]
     piece_ids = [i+1 for i in range(len(piece_data))]
     early_stop = "early_stop" in (early_stop_value or [])
-    reason, result, summary = solve(board, pieces, piece_ids, piece_nums, num_reads,
-                                    coef_use=coef_use or 10, coef_fill=coef_fill or 20,
-                                    early_stop=early_stop)
+    profile = "profile" in (early_stop_value or [])
+    # 盤面やピースを少し変えただけなら、前回の結果のうち今も置ける配置から焼きなます
+    previous = None
+    if "warm_start" in (early_stop_value or []):
+        cached = RESULT_CACHE.get(store.get("結果キー"))
+        previous = decode_result(cached["結果"]) if cached and cached["結果"] else None
+    try:
+        job_id = JOBS.submit(solve_regions, board, pieces, piece_ids, piece_nums, num_reads,
+                             coef_use=coef_use or 10, coef_fill=coef_fill or 20, early_stop=early_stop,
+                             engine=engine or "auto", tune="tune" in (tune_value or []), profile=profile,
+                             max_solutions=max_solutions or 0, previous=previous,
+                             meta={"piece_nums": piece_nums})
+    except JobRejected as e:
+        return dash.no_update, dash.no_update, html.P(f"{e} しばらく待ってから実行してください。", style={"color": "red"})
+    return job_id, False, html.P("待機中…")
+
+@dash.callback(
+    Output("solver-job-status", "children", allow_duplicate=True),
+    Input("cancel-solver", "n_clicks"),
+    State("solver-job-id", "data"),
+    prevent_initial_call=True
+)
+def cancel_solver(n_clicks, job_id):
+    if n_clicks == 0 or job_id is None or JOBS.cancel(job_id) is None:
+        return dash.no_update
+    return html.P("中止しています…")
+
+def _render_progress(job):
+    """実行中ジョブの進捗を表示する"""
+    progress = job.progress
+    if not progress:
+        return html.P(f"{job.status}…")
+    best = "—" if progress["best_energy"] is None else f"{progress['best_energy']:g}"
+    counts = progress["counts"]
+    return html.Div([
+        dbc.Progress(value=100 * progress["reads_done"] / max(progress["num_reads"], 1), className="mb-1"),
+        html.P(
+            f"{job.status}… 読み出し {progress['reads_done']} / {progress['num_reads']}"
+            f"（{progress['reads_per_sec']:.1f} 回/秒）　最良エネルギー {best}"
+        ),
+        html.P(f"成功 {counts['成功']}　空きあり {counts['空きあり']}　使いすぎ {counts['使いすぎ']}"),
+    ])
+
+@dash.callback(
+    Output("redirect-to-result", "pathname"), Output("shared-data", "data", allow_duplicate=True),
+    Output("solver-job-poll", "disabled", allow_duplicate=True),
+    Output("solver-job-status", "children", allow_duplicate=True),
+    Input("solver-job-poll", "n_intervals"),
+    State("solver-job-id", "data"),
+    prevent_initial_call=True
+)
+def poll_solver(_n_intervals, job_id):
+    job = JOBS.get(job_id) if job_id else None
+    if job is None:
+        return dash.no_update, dash.no_update, True, dash.no_update
+    if job.status == "失敗":
+        return dash.no_update, dash.no_update, True, html.P(f"エラー: {job.error}", style={"color": "red"})
+    if job.status == "取消":
+        return dash.no_update, dash.no_update, True, html.P("中止しました。")
+    if job.status != "完了":
+        return dash.no_update, dash.no_update, False, _render_progress(job)
+
+    reason, result, summary = job.result
     print(result)
-    store["ピース枚数"] = piece_nums
-    store["result_summary"] = summary
-    store["結果"] = json.dumps(result)
+    # 結果の欄だけを書き換える（ポーリングのたびに Store 全体を往復させない）
+    store = dash.Patch()
+    store["ピース枚数"] = job.meta["piece_nums"]
+    store["結果キー"] = RESULT_CACHE.put({"結果": encode_result(result) if result else None, "集計": summary})
     store["結果文字"] = reason
-    return "/show-result", store
+    return "/show-result", store, True, ""
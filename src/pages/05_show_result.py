@@ -2,7 +2,10 @@ import dash
 import json
 import dash_bootstrap_components as dbc
 
-from dash import html, Input, Output, dash_table
+from dash import html, Input, Output, State, dash_table
+from .codec import decode_result, piece_color
+from .figures import graph, result_figure
+from .result_cache import RESULT_CACHE
 
 dash.register_page(__name__, path="/show-result", name="結果の表示", title="結果の表示")
 
@@ -19,44 +22,84 @@ layout = html.Div(style={"fontFamily": "Inter, sans-serif", "textAlign": "center
 ])
 
 
+def render_grid(board, colors):
+    return graph(result_figure(board, colors))
+
+
+def piece_colors(pieces):
+    return {i+1: piece_color(key) for i, key in enumerate(pieces)}
+
+
 @dash.callback(
     Output("result-display-area", "children"),
-    Input("shared-data", "data")
+    Input("shared-data", "data"),
+    State("piece-data", "data"),
 )
-def show_board_display(store):
-    if store["結果"] is None:
+def show_board_display(store, pieces):
+    if store.get("結果キー") is None:
         return html.P("まだ、探索されていません。", style={"color": "#777"})
-    board_data_json = store["結果"]
-    try:
-        board = json.loads(board_data_json)
-    except json.JSONDecodeError:
-        return html.P("ボードデータの解析に失敗しました。", style={"color": "red"})
-
-    if not isinstance(board, list) or not all(isinstance(row, list) for row in board):
+    cached = RESULT_CACHE.get(store["結果キー"])
+    if cached is None:
+        return html.P("結果が見つかりません。もう一度探索してください。", style={"color": "red"})
+    if cached["結果"] is None:
         return html.P("無効なボードデータ形式です。", style={"color": "red"})
 
-    pieces = [tuple(p) for p in store["ピース"]]
-    colors = {i+1: p[1] for i, p in enumerate(pieces)}
-    rows = []
-    for row in board:
-        cells = []
-        for cell_value in row:
-            cell_color = "white" if cell_value == 0 else "black" if cell_value is None else colors[int(cell_value.split("-")[0])]
-            cell_style = {
-                "width": "50px", 
-                "height": "50px",
-                "backgroundColor": cell_color,
-                "border": "1px solid #eee" if cell_color == "white" else "1px solid #fff" if cell_color=="black" else "1px solid #000",
-                "display": "flex",
-                "color": "#333" if cell_color == "white" else "#eee" if cell_color=="black" else "#000"
-            }
-            cells.append(html.Div(f"{cell_value}", style=cell_style))
-        rows.append(html.Div(style={"display": "flex"}, children=cells))
-
-    summary = json.loads(store["result_summary"])
+    board = decode_result(cached["結果"])
+    summary = json.loads(cached["集計"])
+    profile = summary.pop("プロファイル", None)
+    solutions = summary.pop("解の一覧", None)
     return html.Div([
-        html.Div(children=rows), html.P(store["結果文字"]),
+        render_grid(board, piece_colors(pieces)), html.P(store["結果文字"]),
+        *render_solution_pager(solutions),
         dash_table.DataTable(
             [{"種別": k, "回数": v} for k, v in summary.items()],
-            [{"name": "種別", "id": "種別"}, {"name": "回数", "id": "回数"}])
+            [{"name": "種別", "id": "種別"}, {"name": "回数", "id": "回数"}]),
+        *render_profile(profile)
     ])
+
+
+def render_solution_pager(solutions):
+    """集めた異なる解を1つずつめくって見るための欄（解を集めていなければ何も出さない）"""
+    if not solutions:
+        return []
+    return [
+        html.H4(f"異なる解（{len(solutions)} 件）", style={"marginTop": "24px"}),
+        dbc.Pagination(id="solution-page", max_value=len(solutions), active_page=1, fully_expanded=False,
+                       className="justify-content-center"),
+        html.Div(id="solution-display-area",
+                 style={"display": "flex", "flexDirection": "column", "alignItems": "center"}),
+    ]
+
+
+@dash.callback(
+    Output("solution-display-area", "children"),
+    Input("solution-page", "active_page"),
+    State("shared-data", "data"),
+    State("piece-data", "data"),
+)
+def show_solution(active_page, store, pieces):
+    cached = RESULT_CACHE.get(store.get("結果キー"))
+    solutions = (json.loads(cached["集計"]).get("解の一覧") or []) if cached else []
+    if not active_page or active_page > len(solutions):
+        return dash.no_update
+    solution = solutions[active_page - 1]
+    return [render_grid(solution["盤面"], piece_colors(pieces)), html.P(f"見つかった回数: {solution['回数']}")]
+
+
+def render_profile(profile):
+    """段階ごとの時間とカウンタの表（計測していなければ何も出さない）"""
+    if not profile:
+        return []
+    timings = profile.get("時間", {})
+    total = timings.get("全体") or sum(timings.values()) or 1.0
+    return [
+        html.H4("段階ごとの時間", style={"marginTop": "24px"}),
+        dash_table.DataTable(
+            [{"段階": k, "時間 [ms]": round(v * 1e3, 2), "割合": f"{v / total:.1%}"} for k, v in timings.items()],
+            [{"name": c, "id": c} for c in ("段階", "時間 [ms]", "割合")]),
+        html.H4("カウンタ", style={"marginTop": "24px"}),
+        dash_table.DataTable(
+            [{"項目": k, "値": round(v, 1) if isinstance(v, float) else v}
+             for k, v in profile.get("カウンタ", {}).items()],
+            [{"name": "項目", "id": "項目"}, {"name": "値", "id": "値"}]),
+    ]
@@ -0,0 +1,78 @@
+import dimod
+import numpy as np
+
+
+def default_beta_range(incidence, limits, coef_use, coef_fill, final_accept=0.01):
+    """最初は最大のエネルギー差を 50% で、最後は最小のエネルギー差を final_accept の確率で受け入れる逆温度"""
+    max_size = int(incidence.sizes.max()) if incidence.num_placements else 1
+    max_limit = int(np.max(limits)) if len(limits) else 1
+    max_delta = coef_fill * 3 * max_size + coef_use * (2 * max_limit + 1)
+    min_delta = min(coef_use, coef_fill)
+    return float(np.log(2) / max_delta), float(np.log(1 / final_accept) / min_delta)
+
+
+class ExactCoverAnnealer:
+    """配置候補とセルの接続関係の上で直接動く焼きなまし
+
+    目的関数は BQM と同じ
+        H = coef_use × Σ_i (used_i − limit_i)² + coef_fill × Σ_j (cover_j − 1)²
+    だが、二次の項を展開せずにセルごとの被覆数 cover とピースごとの使用数 used を持ち続けるので、
+    配置候補 1 つを反転したときのエネルギー差は覆うセルの数に比例する手間で求まる。
+    num_reads 本のレプリカを NumPy の配列として並べ、同じ配置候補の反転をまとめて試す。
+    """
+
+    def __init__(self, incidence, placement_pieces, limits, coef_use=10, coef_fill=20, labels=None,
+                 num_sweeps=200, beta_range=None, initial_state=None):
+        self.incidence = incidence
+        self.placement_pieces = np.asarray(placement_pieces, dtype=np.int64)
+        self.limits = np.asarray(limits, dtype=np.int64)
+        self.coef_use = coef_use
+        self.coef_fill = coef_fill
+        self.labels = labels if labels is not None else list(range(incidence.num_placements))
+        self.num_sweeps = num_sweeps
+        self.beta_range = beta_range if beta_range is not None else self.default_beta_range()
+        self._cells = [incidence.cells_of(p) for p in range(incidence.num_placements)]
+        # 全レプリカをこの 0/1 の配列から始める（None なら全て 0 から）
+        self.initial_state = None if initial_state is None else np.asarray(initial_state, dtype=np.int8)
+
+    def default_beta_range(self):
+        return default_beta_range(self.incidence, self.limits, self.coef_use, self.coef_fill)
+
+    def energies(self, cover, used):
+        return (self.coef_use * np.sum((used - self.limits) ** 2, axis=1)
+                + self.coef_fill * np.sum((cover - 1) ** 2, axis=1))
+
+    def sample(self, num_reads, seed=None, interrupt_function=None):
+        rng = np.random.default_rng(seed)
+        num_placements = self.incidence.num_placements
+        x = np.zeros((num_reads, num_placements), dtype=np.int8)
+        cover = np.zeros((num_reads, self.incidence.num_cells), dtype=np.int64)
+        used = np.zeros((num_reads, len(self.limits)), dtype=np.int64)
+        if self.initial_state is not None:
+            active = np.flatnonzero(self.initial_state)
+            x[:] = self.initial_state
+            cover[:] = self.incidence.coverage(active)
+            used[:] = np.bincount(self.placement_pieces[active], minlength=len(self.limits))
+
+        betas = np.geomspace(*self.beta_range, num=self.num_sweeps)
+        for beta in betas:
+            if interrupt_function is not None and interrupt_function():
+                break
+            for p in rng.permutation(num_placements):
+                cells = self._cells[p]
+                k = self.placement_pieces[p]
+                # 反転の向き: 置かれていなければ +1、置かれていれば −1
+                step = 1 - 2 * x[:, p].astype(np.int64)
+                delta = (self.coef_fill * (2 * step * (cover[:, cells].sum(axis=1) - len(cells)) + len(cells))
+                         + self.coef_use * (2 * step * (used[:, k] - self.limits[k]) + 1))
+                accept = (delta <= 0) | (rng.random(num_reads) < np.exp(-beta * np.maximum(delta, 0)))
+                if not accept.any():
+                    continue
+                change = step * accept
+                x[:, p] += change.astype(np.int8)
+                cover[:, cells] += change[:, None]
+                used[:, k] += change
+
+        return dimod.SampleSet.from_samples(
+            (x, self.labels), dimod.BINARY, energy=self.energies(cover, used)
+        )
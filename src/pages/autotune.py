@@ -0,0 +1,158 @@
+import itertools
+import json
+import math
+import threading
+import time
+import numpy as np
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .annealer import default_beta_range
+
+# 試す係数の組 (coef_use, coef_fill)・スイープ数・最後の受け入れ確率
+COEF_CANDIDATES = [(10, 20), (10, 10), (5, 20), (20, 10)]
+SWEEP_CANDIDATES = [200, 1000]
+FINAL_ACCEPT_CANDIDATES = [0.01, 0.001]
+
+# 調整済みの設定の保存先（リポジトリには含めない）
+DEFAULT_TUNING_PATH = Path(__file__).resolve().parent.parent / "tuned_params.json"
+
+
+def candidate_grid():
+    return [
+        {"coef_use": u, "coef_fill": f, "num_sweeps": s, "final_accept": a}
+        for (u, f), s, a in itertools.product(COEF_CANDIDATES, SWEEP_CANDIDATES, FINAL_ACCEPT_CANDIDATES)
+    ]
+
+
+def sampler_options(solver, params):
+    """設定をサンプラーに渡す num_sweeps と beta_range にする"""
+    beta_range = default_beta_range(
+        solver.model_incidence, solver.model_limits, params["coef_use"], params["coef_fill"], params["final_accept"]
+    )
+    return {"num_sweeps": params["num_sweeps"], "beta_range": beta_range}
+
+
+def instance_key(solver, sampler):
+    """似た問題で同じ設定を使えるように、大きさの特徴（セル数・配置候補数は 2 の冪で丸める）をキーにする"""
+    max_size = max((piece.size for piece in solver.pieces), default=0)
+    return (f"{sampler}/cells{len(solver.cell_index).bit_length()}"
+            f"/placements{len(solver.model_placements).bit_length()}"
+            f"/pieces{len(solver.pieces)}/size{max_size}")
+
+
+def time_to_solution(seconds_per_read, success_rate, target=0.99):
+    """target の確率で1回は成功するまでにかかる時間の見積もり（TTS）"""
+    if success_rate <= 0:
+        return math.inf
+    if success_rate >= 1:
+        return seconds_per_read
+    return seconds_per_read * math.log(1 - target) / math.log(1 - success_rate)
+
+
+@dataclass
+class Trial:
+    """1つの設定の試行結果"""
+    params: dict
+    reads: int = 0
+    successes: int = 0
+    seconds: float = 0.0
+    success_sample: np.ndarray | None = field(default=None, repr=False)
+
+    @property
+    def success_rate(self):
+        return self.successes / self.reads if self.reads else 0.0
+
+    @property
+    def tts(self):
+        return time_to_solution(self.seconds / self.reads if self.reads else math.inf, self.success_rate)
+
+
+@dataclass
+class Tuning:
+    """自動調整の結果。source は "試行" か "保存済み" か "未実施"（params は None）、reads は試行に使った読み出し数"""
+    params: dict | None
+    source: str
+    reads: int = 0
+    trials: list = field(default_factory=list)
+
+    @property
+    def success_sample(self):
+        return next((t.success_sample for t in self.trials if t.success_sample is not None), None)
+
+
+class TuningStore:
+    """調整済みの設定を JSON ファイルに保存する。キーは instance_key()"""
+
+    def __init__(self, path=DEFAULT_TUNING_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._load().get(key)
+        return entry["params"] if entry else None
+
+    def put(self, key, params, **metrics):
+        with self._lock:
+            data = self._load()
+            data[key] = {"params": params, **metrics}
+            self.path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def _pilot(solver, trial, num_reads, seed, workers, sampler, cancel_event):
+    started = time.perf_counter()
+    solver.run(num_reads, coef_use=trial.params["coef_use"], coef_fill=trial.params["coef_fill"], early_stop=False,
+               seed=seed, workers=workers, cancel_event=cancel_event, sampler=sampler,
+               sampler_options=sampler_options(solver, trial.params))
+    trial.seconds += time.perf_counter() - started
+    results = solver.results
+    trial.reads += results.total
+    trial.successes += results.status_counts()["成功"]
+    if trial.success_sample is None and "成功" in results.statuses:
+        trial.success_sample = results.sample(results.statuses.index("成功"))
+    return results.total
+
+
+def autotune(solver, budget, sampler="neal", store=None, seed=None, workers=None, cancel_event=None,
+             candidates=None, min_reads=2, eta=2):
+    """successive halving で係数・スイープ数・逆温度の範囲を選ぶ
+
+    全候補を min_reads 回ずつ試し、TTS（同じなら成功率）の良い 1/eta だけを残して読み出し数を eta 倍にする、
+    を1つに絞れるか、試行の読み出しが budget を超えるまで繰り返す。
+    store に同じ特徴の問題の設定があれば試行せずにそれを使い、試行で成功が出たときは勝った設定を store に残す。
+    budget が最初の1巡（候補数 × min_reads）にも足りないときは何も試さず、source="未実施" を返す
+    （試していない候補を選んだことにはしない）。
+    """
+    key = instance_key(solver, sampler)
+    saved = store.get(key) if store is not None else None
+    if saved is not None:
+        return Tuning(saved, "保存済み")
+
+    rng = np.random.default_rng(seed)
+    trials = [Trial(params) for params in (candidates or candidate_grid())]
+    survivors = list(trials)
+    reads, spent = min_reads, 0
+    while len(survivors) > 1 and spent + reads * len(survivors) <= budget:
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        for trial in survivors:
+            spent += _pilot(solver, trial, reads, int(rng.integers(2 ** 31)), workers, sampler, cancel_event)
+        survivors.sort(key=lambda t: (t.tts, -t.success_rate))
+        survivors = survivors[:max(1, math.ceil(len(survivors) / eta))]
+        reads *= eta
+
+    if spent == 0 and len(trials) > 1:
+        return Tuning(None, "未実施")
+    best = survivors[0]
+    if store is not None and best.successes:
+        store.put(key, best.params, success_rate=best.success_rate, reads=best.reads,
+                  tts=best.tts if math.isfinite(best.tts) else None)
+    return Tuning(best.params, "試行", spent, trials)
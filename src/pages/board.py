@@ -8,40 +8,82 @@ class Board:
     def __post_init__(self):
         self.rows = len(self.grid)
         self.cols = len(self.grid[0])
-       
-    def scan_position_to_place(self, piece_shape):
-        positions = []
+        # 盤面をビット列としても持つ（セル (r, c) が r*cols + c ビット目に対応）
+        self.playable = 0
+        self.occupied = 0
         for r in range(self.rows):
             for c in range(self.cols):
-                if self.can_place(piece_shape, r, c):
+                if self.grid[r][c] is not None:
+                    self.playable |= self.cell_mask(r, c)
+                    if self.grid[r][c] != 0:
+                        self.occupied |= self.cell_mask(r, c)
+        self._shape_masks = {}
+
+    def cell_mask(self, r, c):
+        return 1 << (r * self.cols + c)
+
+    def _shape_mask(self, piece_shape):
+        """ピース形状を (0, 0) に置いたときのビットマスクと、1 のあるマスの範囲を返す"""
+        key = tuple(map(tuple, piece_shape))
+        if key not in self._shape_masks:
+            cells = [(pr, pc) for pr, row in enumerate(piece_shape) for pc, v in enumerate(row) if v == 1]
+            mask = 0
+            for pr, pc in cells:
+                mask |= 1 << (pr * self.cols + pc)
+            r_min = min(pr for pr, _ in cells)
+            r_max = max(pr for pr, _ in cells)
+            c_min = min(pc for _, pc in cells)
+            c_max = max(pc for _, pc in cells)
+            self._shape_masks[key] = (mask, r_min, r_max, c_min, c_max)
+        return self._shape_masks[key]
+
+    def placement_mask(self, piece_shape, r_start, c_start):
+        """ピースを (r_start, c_start) に置いたときのビットマスク。盤面からはみ出す場合は None"""
+        mask, r_min, r_max, c_min, c_max = self._shape_mask(piece_shape)
+        if not (0 <= r_start + r_min and r_start + r_max < self.rows):
+            return None
+        if not (0 <= c_start + c_min and c_start + c_max < self.cols):
+            return None
+        shift = r_start * self.cols + c_start
+        return mask << shift if shift >= 0 else mask >> -shift
+
+    @property
+    def free(self):
+        """まだ何も置かれていない配置可能マス"""
+        return self.playable & ~self.occupied
+
+    def scan_position_to_place(self, piece_shape):
+        positions = []
+        free = self.free
+        _, _, r_max, _, c_max = self._shape_mask(piece_shape)
+        for r in range(self.rows - r_max):
+            for c in range(self.cols - c_max):
+                mask = self.placement_mask(piece_shape, r, c)
+                if mask & free == mask:
                     positions.append((r, c))
         return positions
-    
+
     def can_place(self, piece_shape, r_start, c_start):
         """指定された位置にピースの特定の形状を配置できるかを確認する"""
-        piece_rows = len(piece_shape)
-        piece_cols = len(piece_shape[0])
+        mask = self.placement_mask(piece_shape, r_start, c_start)
+        # 盤面の範囲外・配置不可マス・配置済みマスのいずれかに掛かっていれば置けない
+        return mask is not None and mask & self.free == mask
 
-        for pr in range(piece_rows):
-            for pc in range(piece_cols):
-                if piece_shape[pr][pc] == 1:
-                    br, bc = r_start + pr, c_start + pc
-                    if not (0 <= br < self.rows and 0 <= bc < self.cols):
-                        # 盤面の範囲外チェック
-                        return False
-                    if self.grid[br][bc] is None:
-                        # 配置不可マスチェック
-                        return False
-                    if self.grid[br][bc] != 0:
-                        # 配置済みマス
-                        return False
-
-        return True
+    def overlaps(self, mask):
+        return mask & self.occupied != 0
+
+    def is_full(self):
+        """配置可能マスがすべて埋まっているか"""
+        return self.occupied & self.playable == self.playable
+
+    def num_empty(self):
+        return self.free.bit_count()
 
     def wipe_out(self):
         for r in range(self.rows):
             for c in range(self.cols):
                 self.grid[r][c] = 0 if self.grid[r][c] is not None else None
+        self.occupied = 0
 
     def fill(self, piece, r_start, c_start):
         piece_rows = len(piece.piece_shape)
@@ -52,6 +94,7 @@ class Board:
                 br, bc = r_start + pr, c_start + pc
                 if piece.piece_shape[pr][pc] == 1:
                     self.grid[br][bc] = piece.name
+        self.occupied |= self.placement_mask(piece.piece_shape, r_start, c_start)
 
     def __str__(self):
         """盤面を見やすく文字列として表現する"""
@@ -0,0 +1,73 @@
+import json
+
+from functools import lru_cache
+
+from .board import Board
+from .piece import Piece
+
+# セッションの Store に入れる盤面・ピース・結果の詰めた表現。
+# セル (r, c) は Board と同じく r * cols + c ビット目に対応し、マスクは16進の文字列で持つ。
+
+
+def encode_board(grid):
+    """盤面（0 が配置可能、None が配置不可）を {"rows", "cols", "mask": 配置可能セルのマスク} にする"""
+    return {"rows": len(grid), "cols": len(grid[0]), "mask": f"{Board(grid).playable:x}"}
+
+
+def decode_board(data):
+    rows, cols, mask = data["rows"], data["cols"], int(data["mask"], 16)
+    return [[0 if mask >> (r * cols + c) & 1 else None for c in range(cols)] for r in range(rows)]
+
+
+def piece_key(shape):
+    """ピースの形を正規化した向き（Piece.dump と同じ）で "行x列:マスク" の文字列にする。同じ形なら同じキーになる"""
+    normalized = json.loads(Piece(shape).dump()[0])
+    cols = len(normalized[0])
+    mask = sum(1 << (r * cols + c) for r, row in enumerate(normalized) for c, v in enumerate(row) if v == 1)
+    return f"{len(normalized)}x{cols}:{mask:x}"
+
+
+def piece_shape(key):
+    size, mask = key.split(":")
+    rows, cols = (int(n) for n in size.split("x"))
+    mask = int(mask, 16)
+    return [[mask >> (r * cols + c) & 1 for c in range(cols)] for r in range(rows)]
+
+
+@lru_cache(maxsize=256)
+def piece_color(key):
+    """ピースの表示色（形から決まる）"""
+    return Piece(piece_shape(key)).dump()[1]
+
+
+def encode_result(grid):
+    """結果の盤面を、配置ごとの (名前, 覆うセルのマスク) の列と配置不可セルのマスクにする
+
+    セルごとに名前の文字列を並べるより、置いたピースの数だけの大きさで済む。
+    """
+    rows, cols = len(grid), len(grid[0])
+    walls, placements = 0, {}
+    for r, row in enumerate(grid):
+        for c, value in enumerate(row):
+            bit = 1 << (r * cols + c)
+            if value is None:
+                walls |= bit
+            elif value != 0:
+                placements[value] = placements.get(value, 0) | bit
+    return {
+        "rows": rows, "cols": cols, "walls": f"{walls:x}",
+        "placements": [[name, f"{mask:x}"] for name, mask in placements.items()],
+    }
+
+
+def decode_result(data):
+    rows, cols, walls = data["rows"], data["cols"], int(data["walls"], 16)
+    grid = [[None if walls >> (r * cols + c) & 1 else 0 for c in range(cols)] for r in range(rows)]
+    for name, mask in data["placements"]:
+        mask = int(mask, 16)
+        while mask:
+            bit = mask & -mask
+            r, c = divmod(bit.bit_length() - 1, cols)
+            grid[r][c] = name
+            mask ^= bit
+    return grid
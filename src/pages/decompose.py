@@ -0,0 +1,119 @@
+from collections import deque
+
+from .board import Board
+from .piece import Piece
+
+
+def connected_regions(board_grid):
+    """配置可能セルを上下左右のつながりで連結成分に分ける（各成分はセル (r, c) のリスト）"""
+    rows, cols = len(board_grid), len(board_grid[0])
+    seen = set()
+    regions = []
+    for r in range(rows):
+        for c in range(cols):
+            if board_grid[r][c] is None or (r, c) in seen:
+                continue
+            region = []
+            queue = deque([(r, c)])
+            seen.add((r, c))
+            while queue:
+                cr, cc = queue.popleft()
+                region.append((cr, cc))
+                for nr, nc in ((cr - 1, cc), (cr + 1, cc), (cr, cc - 1), (cr, cc + 1)):
+                    if 0 <= nr < rows and 0 <= nc < cols and board_grid[nr][nc] is not None and (nr, nc) not in seen:
+                        seen.add((nr, nc))
+                        queue.append((nr, nc))
+            regions.append(sorted(region))
+    return regions
+
+
+def crop_region(region):
+    """連結成分だけを含む最小の盤面と、その左上の元の盤面での位置を返す"""
+    r0 = min(r for r, _ in region)
+    c0 = min(c for _, c in region)
+    rows = max(r for r, _ in region) - r0 + 1
+    cols = max(c for _, c in region) - c0 + 1
+    grid = [[None] * cols for _ in range(rows)]
+    for r, c in region:
+        grid[r - r0][c - c0] = 0
+    return grid, (r0, c0)
+
+
+def piece_fits(region_grid, piece):
+    board = Board(region_grid)
+    return any(board.scan_position_to_place(v) for v in piece.variations)
+
+
+def allocate_limits(areas, sizes, limits, fits, max_allocations=100):
+    """各連結成分をちょうど埋めるピース枚数の割り当てを列挙する
+
+    areas[r]: 成分 r のセル数、sizes[k]: ピース k のセル数、limits[k]: ピース k の使用上限
+    fits[r][k]: ピース k が成分 r に置けるか
+    成分ごとに Σ_k n_{r,k} · sizes[k] = areas[r] を満たし、全成分で Σ_r n_{r,k} <= limits[k] となる
+    [n_{r,k}] を最大 max_allocations 通り返す。面積の大きい成分から決めていき、残りの面積と
+    残りのピースで埋められる面積を比べて早めに枝を刈る。
+    """
+    order = sorted(range(len(areas)), key=lambda r: -areas[r])
+    allocation = [None] * len(areas)
+    found = []
+
+    def capacity(remaining, regions):
+        # 残りのピースで埋められる面積の上限
+        return sum(remaining[k] * sizes[k] for k in range(len(sizes)) if any(fits[r][k] for r in regions))
+
+    def fill_region(i, remaining):
+        if len(found) >= max_allocations:
+            return
+        if i == len(order):
+            found.append([list(a) for a in allocation])
+            return
+        if capacity(remaining, order[i:]) < sum(areas[r] for r in order[i:]):
+            return
+        r = order[i]
+        counts = [0] * len(sizes)
+
+        def choose(k, area_left):
+            if len(found) >= max_allocations:
+                return
+            if area_left == 0:
+                allocation[r] = list(counts)
+                fill_region(i + 1, [remaining[j] - counts[j] for j in range(len(sizes))])
+                return
+            if k == len(sizes):
+                return
+            if not fits[r][k]:
+                choose(k + 1, area_left)
+                return
+            for n in range(min(remaining[k], area_left // sizes[k]), -1, -1):
+                counts[k] = n
+                choose(k + 1, area_left - n * sizes[k])
+            counts[k] = 0
+
+        choose(0, areas[r])
+
+    fill_region(0, list(limits))
+    return found
+
+
+def decompose(board_grid, piece_grids, limits, max_allocations=100):
+    """盤面を連結成分に分け、成分ごとの盤面と枚数の割り当て候補を返す"""
+    regions = connected_regions(board_grid)
+    crops = [crop_region(region) for region in regions]
+    pieces = [Piece(g) for g in piece_grids]
+    fits = [[piece_fits(grid, piece) for piece in pieces] for grid, _ in crops]
+    allocations = allocate_limits(
+        [len(region) for region in regions], [piece.size for piece in pieces], [int(n) for n in limits],
+        fits, max_allocations=max_allocations
+    )
+    return crops, allocations
+
+
+def stitch(board_grid, crops, grids):
+    """成分ごとの結果の盤面を元の盤面の上に書き戻す"""
+    result = [list(row) for row in board_grid]
+    for (_, (r0, c0)), grid in zip(crops, grids):
+        for r, row in enumerate(grid):
+            for c, cell in enumerate(row):
+                if cell is not None:
+                    result[r0 + r][c0 + c] = cell
+    return result
@@ -0,0 +1,124 @@
+import time
+
+import numpy as np
+
+
+class SearchBudgetExceeded(Exception):
+    """探索ノード数か時間の上限に達した"""
+
+
+class SearchCancelled(Exception):
+    """cancel_event がセットされた"""
+
+
+class ExactSearch:
+    """Knuth の Algorithm X による厳密探索
+
+    セルを「ちょうど1回覆う」列、配置候補を行とする完全被覆問題として解く。ピースの枚数上限は、
+    ピース k を limits[k] 枚使った時点でその残りの配置候補を行ごと取り除くことで扱う。
+    dancing links の代わりに、列 → 行の集合の辞書を外して戻す（Ali Assaf の実装と同じ形）。
+    """
+
+    def __init__(self, incidence, placement_pieces, limits, max_nodes=1_000_000, time_limit=10.0, cancel_event=None):
+        self.incidence = incidence
+        self.placement_pieces = np.asarray(placement_pieces)
+        self.limits = [int(n) for n in limits]
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.cancel_event = cancel_event
+        self.nodes = 0
+
+    def search(self):
+        """解を1つ探す。("成功", 配置候補の番号のリスト) か ("解なし" / "打ち切り" / "中断", None) を返す"""
+        try:
+            solution = next(self.iter_solutions(), None)
+        except SearchBudgetExceeded:
+            return "打ち切り", None
+        except SearchCancelled:
+            return "中断", None
+        if solution is None:
+            return "解なし", None
+        return "成功", solution
+
+    def iter_solutions(self):
+        """解（配置候補の番号のリスト）を見つけた順に返す
+
+        予算を超えると SearchBudgetExceeded を、cancel_event がセットされると SearchCancelled を送出する。
+        """
+        columns = {j: set(self.incidence.placements_of(j).tolist()) for j in range(self.incidence.num_cells)}
+        rows = {p: self.incidence.cells_of(p).tolist() for p in range(self.incidence.num_placements)}
+        by_piece = {}
+        for p, k in enumerate(self.placement_pieces.tolist()):
+            by_piece.setdefault(k, []).append(p)
+        used = [0] * len(self.limits)
+        for k, limit in enumerate(self.limits):
+            if limit <= 0:
+                for p in by_piece.get(k, []):
+                    self._remove_row(columns, rows, p)
+
+        self.nodes = 0
+        self._deadline = time.perf_counter() + self.time_limit
+        yield from self._solve(columns, rows, by_piece, used, [])
+
+    def _solve(self, columns, rows, by_piece, used, partial):
+        if not columns:
+            yield list(partial)
+            return
+        self.nodes += 1
+        if self.nodes > self.max_nodes or time.perf_counter() > self._deadline:
+            raise SearchBudgetExceeded()
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise SearchCancelled()
+
+        # 候補の最も少ないセルから決める
+        j = min(columns, key=lambda c: len(columns[c]))
+        for p in sorted(columns[j]):
+            k = self.placement_pieces[p]
+            partial.append(p)
+            used[k] += 1
+            removed = self._select(columns, rows, p)
+            exhausted = []
+            if used[k] == self.limits[k]:
+                exhausted = [q for q in by_piece[k] if self._remove_row(columns, rows, q)]
+            try:
+                yield from self._solve(columns, rows, by_piece, used, partial)
+            finally:
+                for q in reversed(exhausted):
+                    self._restore_row(columns, rows, q)
+                self._deselect(columns, rows, p, removed)
+                used[k] -= 1
+                partial.pop()
+
+    @staticmethod
+    def _select(columns, rows, p):
+        removed = []
+        for j in rows[p]:
+            for q in columns[j]:
+                for i in rows[q]:
+                    if i != j and i in columns:
+                        columns[i].remove(q)
+            removed.append(columns.pop(j))
+        return removed
+
+    @staticmethod
+    def _deselect(columns, rows, p, removed):
+        for j in reversed(rows[p]):
+            columns[j] = removed.pop()
+            for q in columns[j]:
+                for i in rows[q]:
+                    if i != j and i in columns:
+                        columns[i].add(q)
+
+    @staticmethod
+    def _remove_row(columns, rows, q):
+        """まだ残っている行 q を、残っている列から取り除く。取り除いたら True"""
+        present = [j for j in rows[q] if j in columns and q in columns[j]]
+        for j in present:
+            columns[j].remove(q)
+        return bool(present)
+
+    @staticmethod
+    def _restore_row(columns, rows, q):
+        for j in rows[q]:
+            if j in columns:
+                columns[j].add(q)
@@ -0,0 +1,150 @@
+import json
+import plotly.graph_objects as go
+
+from dash import dcc, html
+from functools import lru_cache
+
+from .codec import decode_board, piece_color, piece_shape
+
+EMPTY_COLOR = "#fff"
+WALL_COLOR = "#222"
+
+# 盤面の図はクリックとホバーだけを受け付け、ズームや移動はさせない
+GRAPH_CONFIG = {"displayModeBar": False, "scrollZoom": False, "doubleClick": False}
+
+
+def _discrete_colorscale(colors):
+    """z = 0, 1, ..., len(colors) - 1 をそれぞれ colors の色で塗るカラースケール"""
+    if len(colors) == 1:
+        colors = colors * 2
+    n = len(colors)
+    scale = []
+    for i, color in enumerate(colors):
+        scale += [[i / n, color], [(i + 1) / n, color]]
+    return scale
+
+
+def grid_figure(z, colors, cell_size=40, text=None, hover=None):
+    """セルごとの色番号 z（二次元リスト）を、1つのヒートマップで描いた図にする
+
+    セルを1つずつ部品にしないので、盤面が大きくなっても部品の数は変わらない。
+    セル (r, c) は x = c, y = r に置き、クリックされたセルは clickData の points[0] の x, y で分かる。
+    """
+    rows, cols = len(z), len(z[0]) if z else 0
+    heatmap = go.Heatmap(
+        z=z, x=list(range(cols)), y=list(range(rows)), zmin=-0.5, zmax=len(colors) - 0.5,
+        colorscale=_discrete_colorscale(colors), showscale=False, xgap=1, ygap=1,
+        text=text, texttemplate="%{text}" if text is not None else None,
+        hovertext=hover, hoverinfo="text" if hover is not None else "none",
+    )
+    figure = go.Figure(heatmap)
+    figure.update_layout(
+        width=cols * cell_size, height=rows * cell_size, margin={"l": 0, "r": 0, "t": 0, "b": 0},
+        template="none", plot_bgcolor="#aaa", paper_bgcolor="rgba(0,0,0,0)", dragmode=False,
+    )
+    figure.update_xaxes(visible=False, fixedrange=True, range=[-0.5, cols - 0.5])
+    figure.update_yaxes(visible=False, fixedrange=True, range=[rows - 0.5, -0.5])
+    return figure
+
+
+def board_figure(board, cell_size=40):
+    """盤面（0 が配置可能、None が配置不可）の図"""
+    return grid_figure([[1 if v is None else 0 for v in row] for row in board], [EMPTY_COLOR, WALL_COLOR], cell_size)
+
+
+def piece_figure(grid, color, cell_size=40):
+    """ピース（1 がミノのあるマス）の図"""
+    return grid_figure([[1 if int(v) == 1 else 0 for v in row] for row in grid], [EMPTY_COLOR, color], cell_size)
+
+
+def result_figure(board, colors, cell_size=50):
+    """結果の盤面の図。配置はピースの色で塗り、配置の名前をセルに書く
+
+    colors はピースの番号から色への辞書。名前は "番号-通し番号"（成分ごとに解いたときは後ろに ".成分"）。
+    """
+    palette = [EMPTY_COLOR, WALL_COLOR]
+    index = {}
+    z, text = [], []
+    for row in board:
+        z_row, text_row = [], []
+        for value in row:
+            if value is None:
+                z_row.append(1)
+                text_row.append("")
+            elif value == 0:
+                z_row.append(0)
+                text_row.append("")
+            else:
+                piece_id = int(str(value).split("-")[0])
+                if piece_id not in index:
+                    index[piece_id] = len(palette)
+                    palette.append(colors.get(piece_id, "#888"))
+                z_row.append(index[piece_id])
+                text_row.append(str(value))
+        z.append(z_row)
+        text.append(text_row)
+    return grid_figure(z, palette, cell_size, text=text, hover=text)
+
+
+# 同じ盤面・ピースの図は組み立て直さない。キーは Store に入っている盤面のマスクやピースのキーそのもの
+@lru_cache(maxsize=256)
+def cached_board_figure(rows, cols, mask, cell_size=40):
+    return board_figure(decode_board({"rows": rows, "cols": cols, "mask": mask}), cell_size)
+
+
+@lru_cache(maxsize=256)
+def cached_piece_figure(key, cell_size=40):
+    return piece_figure(piece_shape(key), piece_color(key), cell_size)
+
+
+def graph(figure, **kwargs):
+    return dcc.Graph(figure=figure, config=GRAPH_CONFIG, **kwargs)
+
+
+def render_board(board_data, cell_size=30):
+    """Store の盤面（codec.encode_board の形）を図にする（未定義や壊れたデータならその旨を返す）"""
+    if board_data is None:
+        return html.P("まだボードは定義されていません。", style={"color": "#777"})
+    try:
+        figure = cached_board_figure(board_data["rows"], board_data["cols"], board_data["mask"], cell_size)
+    except (KeyError, TypeError, ValueError):
+        return html.P("無効なボードデータ形式です。", style={"color": "red"})
+    return graph(figure)
+
+
+PIECE_LIST_STYLE = {"display": "flex", "flexWrap": "wrap", "justifyContent": "center"}
+
+
+def piece_item(i, key, cell_size=30, footer=None):
+    """ピース一覧の1つ分（key は codec.piece_key）。footer(i) があれば図の下に置く"""
+    children = [graph(cached_piece_figure(key, cell_size))]
+    if footer is not None:
+        children.append(footer(i))
+    return html.Div(children, style={"display": "flex", "flexDirection": "column", "margin": "10px"})
+
+
+def piece_list(pieces, cell_size=30, footer=None):
+    """保存済みのピース（キーの列）を小さな図で並べる"""
+    return html.Div([piece_item(i, key, cell_size, footer) for i, key in enumerate(pieces)], style=PIECE_LIST_STYLE)
+
+
+def toggle_cell_js(off, on):
+    """クリックされたセルの値を off ⇔ on で切り替えるクライアント側のコールバック
+
+    入力は (clickData, 図, グリッド)、出力は (図, グリッド)。サーバーとのやり取りは無く、図は z の1要素だけを書き換える。
+    """
+    return f"""
+    function(clickData, figure, grid) {{
+        const noUpdate = window.dash_clientside.no_update;
+        if (!clickData || !figure || !grid || !grid.length) {{
+            return [noUpdate, noUpdate];
+        }}
+        const r = clickData.points[0].y, c = clickData.points[0].x;
+        const next = grid.map(row => row.slice());
+        next[r][c] = next[r][c] === {json.dumps(on)} ? {json.dumps(off)} : {json.dumps(on)};
+        const z = figure.data[0].z.map(row => row.slice());
+        z[r][c] = next[r][c] === {json.dumps(on)} ? 1 : 0;
+        const data = [Object.assign({{}}, figure.data[0], {{z: z}})];
+        return [Object.assign({{}}, figure, {{data: data}}), next];
+    }}
+    """
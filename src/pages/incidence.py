@@ -0,0 +1,63 @@
+import numpy as np
+
+from dataclasses import dataclass
+
+
+@dataclass
+class Incidence:
+    """配置候補とセルの接続関係を CSR 形式で両方向に持つ
+
+    indptr / indices: 配置候補 p が覆うセルは indices[indptr[p]:indptr[p+1]]
+    cell_indptr / cell_indices: セル j を覆う配置候補は cell_indices[cell_indptr[j]:cell_indptr[j+1]]
+    """
+    num_cells: int
+    indptr: np.ndarray
+    indices: np.ndarray
+    cell_indptr: np.ndarray
+    cell_indices: np.ndarray
+
+    @classmethod
+    def from_lists(cls, placement_cells, num_cells):
+        lengths = np.array([len(cells) for cells in placement_cells], dtype=np.int64)
+        indptr = np.zeros(len(placement_cells) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        if len(placement_cells) == 0:
+            indices = np.empty(0, dtype=np.int64)
+        else:
+            indices = np.concatenate([np.asarray(c, dtype=np.int64) for c in placement_cells])
+
+        # 転置（セル → 配置候補）はセル番号で安定ソートするだけで得られる
+        placements = np.repeat(np.arange(len(placement_cells), dtype=np.int64), lengths)
+        order = np.argsort(indices, kind="stable")
+        cell_indptr = np.zeros(num_cells + 1, dtype=np.int64)
+        np.cumsum(np.bincount(indices, minlength=num_cells), out=cell_indptr[1:])
+        return cls(num_cells, indptr, indices, cell_indptr, placements[order])
+
+    @property
+    def num_placements(self):
+        return len(self.indptr) - 1
+
+    @property
+    def sizes(self):
+        """配置候補ごとの覆うセル数"""
+        return np.diff(self.indptr)
+
+    def cells_of(self, p):
+        return self.indices[self.indptr[p]:self.indptr[p + 1]]
+
+    def placements_of(self, j):
+        return self.cell_indices[self.cell_indptr[j]:self.cell_indptr[j + 1]]
+
+    def coverage(self, active):
+        """選ばれた配置候補 active がそれぞれのセルを何回覆うかを数える"""
+        active = np.asarray(active, dtype=np.int64)
+        if len(active) == 0:
+            return np.zeros(self.num_cells, dtype=np.int64)
+        cells = np.concatenate([self.cells_of(p) for p in active])
+        return np.bincount(cells, minlength=self.num_cells)
+
+    def to_dense(self, dtype=np.float32):
+        """配置候補 × セルの 0/1 行列。サンプル行列との積で全サンプルの被覆数を一度に求めるのに使う"""
+        matrix = np.zeros((self.num_placements, self.num_cells), dtype=dtype)
+        matrix[np.repeat(np.arange(self.num_placements), self.sizes), self.indices] = 1
+        return matrix
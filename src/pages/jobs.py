@@ -0,0 +1,86 @@
+import threading
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+
+class JobRejected(Exception):
+    """実行中・待機中のジョブが上限に達していて受け付けられない"""
+
+
+@dataclass
+class Job:
+    job_id: str
+    status: str = "待機中"
+    result: Any = None
+    error: str = ""
+    meta: dict = field(default_factory=dict)
+    progress: dict = field(default_factory=dict)
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+
+    def set_progress(self, progress):
+        self.progress = progress
+
+
+class JobManager:
+    """求解をバックグラウンドのスレッドで実行するジョブ管理
+
+    同時に実行するのは max_workers 件まで、さらに max_queued 件までを待たせる。それを超える投入は
+    JobRejected で断る。アニーリング本体は GIL を手放すので、スレッドでも並行に進む。
+    """
+
+    FINISHED = ("完了", "取消", "失敗")
+
+    def __init__(self, max_workers=2, max_queued=4, max_kept=100):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_kept = max_kept
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="solver-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, meta=None, **kwargs):
+        """fn(*args, cancel_event=..., progress=..., **kwargs) をジョブとして投入し、ジョブ ID を返す
+
+        fn は progress に渡される関数を呼んで、途中経過の dict を job.progress に残せる。
+        """
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job.status not in self.FINISHED)
+            if active >= self.max_workers + self.max_queued:
+                raise JobRejected(f"実行中・待機中のジョブが上限（{active} 件）に達しています。")
+            self._forget_finished()
+            job = Job(uuid.uuid4().hex, meta=meta or {})
+            self._jobs[job.job_id] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job.job_id
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancel_event.is_set():
+            job.status = "取消"
+            return
+        job.status = "実行中"
+        try:
+            job.result = fn(*args, cancel_event=job.cancel_event, progress=job.set_progress, **kwargs)
+        except Exception as e:
+            job.error = str(e)
+            job.status = "失敗"
+            return
+        job.status = "取消" if job.cancel_event.is_set() else "完了"
+
+    def _forget_finished(self):
+        """終わったジョブを古い順に捨て、保持する件数を max_kept 以下にする"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in self.FINISHED]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_kept + 1)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel_event.set()
+        return job
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import threading
+
+from collections import OrderedDict
+
+
+class ModelCache:
+    """組み立て済みのモデルを (ボード, ピース, 枚数) ごとに保持する LRU キャッシュ
+
+    保持しているモデルの nbytes の合計が max_bytes を超えたら、古く使われたものから捨てる。
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(board_grid, piece_grids, piece_ids, limits, **options):
+        """入力を正規化した JSON のハッシュ（options はモデルの組み立て方を変える設定）"""
+        canonical = json.dumps(
+            {
+                "board": board_grid,
+                "pieces": [[[int(c) for c in row] for row in g] for g in piece_grids],
+                "piece_ids": list(piece_ids),
+                "limits": [int(n) for n in limits],
+                "options": options,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key, build):
+        """key に対応するモデルを返す。無ければ build() で組み立てて保持する"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        model = build()
+        with self._lock:
+            self._entries[key] = model
+            self._entries.move_to_end(key)
+            while len(self._entries) > 1 and self.nbytes > self.max_bytes:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return model
+
+    def latest(self):
+        """最後に使ったモデル（無ければ None）。少し変えた問題を組み立て直すときの土台にする"""
+        with self._lock:
+            return next(reversed(self._entries.values()), None)
+
+    @property
+    def nbytes(self):
+        return sum(model.nbytes for model in self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self._entries), "nbytes": self.nbytes,
+            }
@@ -0,0 +1,107 @@
+import numpy as np
+
+from dataclasses import dataclass, field
+
+
+@dataclass
+class PresolveResult:
+    """前処理の結果。forced は必ず置く配置候補、removed は置けない配置候補"""
+    forced: list = field(default_factory=list)
+    removed: set = field(default_factory=set)
+    infeasible: bool = False
+
+    @property
+    def num_eliminated(self):
+        return len(self.forced) + len(self.removed)
+
+
+def _pocket_too_small(start, free, neighbors, min_size):
+    """start を含む空きマスの連結成分が min_size マス未満かを、min_size マスまで数えて調べる"""
+    seen = {start}
+    stack = [start]
+    while stack:
+        j = stack.pop()
+        for n in neighbors[j]:
+            if free[n] and n not in seen:
+                seen.add(n)
+                if len(seen) >= min_size:
+                    return False
+                stack.append(n)
+    return len(seen) < min_size
+
+
+def presolve(incidence, placement_pieces, limits, neighbors, piece_sizes):
+    """QUBO を作る前に、答えに入り得ない配置候補と必ず入る配置候補を見つける
+
+    次の3つを変化がなくなるまで繰り返す。
+    - 1つの配置候補でしか覆えないセルがあれば、その配置候補を固定する
+      （重なる配置候補と、使い切ったピースの配置候補は取り除く）
+    - 置くと周りに、残りのどのピースよりも小さい空きの塊ができる配置候補を取り除く
+    - どの配置候補でも覆えないセルが残れば、解なし (infeasible) とする
+    neighbors[j] はセル j の上下左右の配置可能セル、piece_sizes[k] はピース k のセル数。
+    """
+    placement_pieces = np.asarray(placement_pieces)
+    alive = np.ones(incidence.num_placements, dtype=bool)
+    free = np.ones(incidence.num_cells, dtype=bool)
+    remaining = [int(n) for n in limits]
+    result = PresolveResult()
+
+    def remove(p):
+        if alive[p]:
+            alive[p] = False
+            result.removed.add(int(p))
+
+    def force(p):
+        alive[p] = False
+        result.forced.append(int(p))
+        cells = incidence.cells_of(p)
+        for j in cells:
+            for q in incidence.placements_of(j):
+                remove(q)
+        free[cells] = False
+        k = placement_pieces[p]
+        remaining[k] -= 1
+        if remaining[k] <= 0:
+            for q in np.flatnonzero(alive & (placement_pieces == k)):
+                remove(q)
+
+    # 使える枚数が 0 のピースの配置候補は最初から取り除く（残すと固定されて枚数を超えてしまう）
+    for p in np.flatnonzero([remaining[k] <= 0 for k in placement_pieces]):
+        remove(p)
+
+    changed = True
+    while changed and not result.infeasible:
+        changed = False
+        for j in np.flatnonzero(free):
+            if not free[j]:
+                continue
+            candidates = [p for p in incidence.placements_of(j) if alive[p]]
+            if not candidates:
+                result.infeasible = True
+                break
+            if len(candidates) == 1:
+                force(candidates[0])
+                changed = True
+        if result.infeasible:
+            break
+
+        sizes = [
+            piece_sizes[k] for k in range(len(remaining))
+            if remaining[k] > 0 and np.any(alive & (placement_pieces == k))
+        ]
+        if not sizes:
+            result.infeasible = bool(free.any())
+            break
+        min_size = min(sizes)
+        if min_size <= 1:
+            continue
+        for p in np.flatnonzero(alive):
+            cells = incidence.cells_of(p)
+            free[cells] = False
+            border = {n for j in cells for n in neighbors[j] if free[n]}
+            if any(_pocket_too_small(n, free, neighbors, min_size) for n in border):
+                remove(p)
+                changed = True
+            free[cells] = True
+
+    return result
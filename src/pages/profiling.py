@@ -0,0 +1,67 @@
+import json
+import logging
+import time
+
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+_NO_PHASE = nullcontext()
+
+
+class _Phase:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        timings = self.profiler.timings
+        timings[self.name] = timings.get(self.name, 0.0) + time.perf_counter() - self.started
+
+
+class Profiler:
+    """段階ごとの経過時間 [s] とカウンタを集める
+
+    enabled=False のときは phase() が使い回しの何もしないコンテキストを返し、count()・set() もすぐ戻るので、
+    計測を切った状態で呼び出し側に残しておいても手間はほとんど掛からない。
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.timings = {}
+        self.counters = {}
+
+    def phase(self, name):
+        """with profiler.phase("名前"): で囲んだ区間の時間を名前ごとに足し合わせる"""
+        if not self.enabled:
+            return _NO_PHASE
+        return _Phase(self, name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, name, value):
+        if self.enabled:
+            self.counters[name] = value
+
+    def merge(self, profile):
+        """to_dict() の結果（別のプロセスで取ったものなど）を足し合わせる"""
+        for name, seconds in profile.get("時間", {}).items():
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+        for name, value in profile.get("カウンタ", {}).items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        return {"時間": dict(self.timings), "カウンタ": dict(self.counters)}
+
+    def log(self, event, **fields):
+        """計測結果を1行の JSON としてログに書く（INFO が有効なときだけ）"""
+        if self.enabled and logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({"event": event, **fields, **self.to_dict()}, ensure_ascii=False))
+
+
+NULL_PROFILER = Profiler(enabled=False)
@@ -0,0 +1,192 @@
+import dimod
+import numpy as np
+
+from dataclasses import dataclass
+
+
+def _pairs_within_groups(groups, members):
+    """同じグループに属する要素同士の組をすべて列挙する
+
+    groups と members は同じ長さの一次元配列で、members[i] がグループ groups[i] に属することを表す。
+    同じ大きさのグループをまとめて二次元配列に並べ、triu_indices で一度に組を作る。
+    """
+    if len(members) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    order = np.argsort(groups, kind="stable")
+    groups = groups[order]
+    members = members[order]
+    _, starts, sizes = np.unique(groups, return_index=True, return_counts=True)
+
+    us, vs = [], []
+    for size in np.unique(sizes):
+        if size < 2:
+            continue
+        block_starts = starts[sizes == size]
+        block = members[block_starts[:, None] + np.arange(size)[None, :]]
+        iu, iv = np.triu_indices(size, k=1)
+        us.append(block[:, iu].ravel())
+        vs.append(block[:, iv].ravel())
+    if not us:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    return np.concatenate(us), np.concatenate(vs)
+
+
+def use_terms(placement_pieces, limits):
+    """使用数制約 Σ_i ( Σ_k x_{i,k} − limit_i )² を展開した係数を返す
+
+    x² = x を使うと、(Σx − L)² = Σ(1 − 2L)x + 2Σ_{k<l} x_k x_l + L² となる。
+    戻り値は (linear, (row, col, bias), offset)。
+    """
+    placement_pieces = np.asarray(placement_pieces, dtype=np.int64)
+    limits = np.asarray(limits, dtype=np.float64)
+
+    linear = 1.0 - 2.0 * limits[placement_pieces]
+    row, col = _pairs_within_groups(placement_pieces, np.arange(len(placement_pieces)))
+    bias = np.full(len(row), 2.0)
+    offset = float(np.sum(limits ** 2))
+    return linear, (row, col, bias), offset
+
+
+def fill_terms(incidence):
+    """充填制約 Σ_j ( Σ_{i,k} x_{i,k} · 1[v_{i,k} covers j] − 1 )² を展開した係数を返す
+
+    (Σx − 1)² = −Σx + 2Σ_{k<l} x_k x_l + 1 なので、各配置候補の一次係数は「覆うセル数 × −1」、
+    同じセルを覆う配置候補の組ごとに二次係数 2 が加算される。
+    """
+    cells = np.repeat(np.arange(incidence.num_cells, dtype=np.int64), np.diff(incidence.cell_indptr))
+
+    linear = -incidence.sizes.astype(np.float64)
+    row, col = _pairs_within_groups(cells, incidence.cell_indices)
+    bias = np.full(len(row), 2.0)
+    offset = float(incidence.num_cells)
+    return linear, (row, col, bias), offset
+
+
+@dataclass
+class QuboParts:
+    """使用数制約と充填制約を係数 1 で展開したもの。係数を掛けて足し合わせるだけで BQM になる
+
+    二次の項は両制約で共通の変数の組 (row, col) に並べてあり、use_quadratic / fill_quadratic が
+    それぞれの制約の係数を持つ。
+    """
+    use_linear: np.ndarray
+    fill_linear: np.ndarray
+    row: np.ndarray
+    col: np.ndarray
+    use_quadratic: np.ndarray
+    fill_quadratic: np.ndarray
+    use_offset: float
+    fill_offset: float
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, f).nbytes for f in ("use_linear", "fill_linear", "row", "col", "use_quadratic", "fill_quadratic"))
+
+
+def build_parts(incidence, placement_pieces, limits):
+    """配置候補とセルの接続関係から、制約ごとの係数を求める
+
+    incidence: 配置候補とセルの接続関係 (Incidence)
+    placement_pieces: 配置候補ごとのピース番号 (limits の添字)
+    """
+    use_linear, (use_row, use_col, use_bias), use_offset = use_terms(placement_pieces, limits)
+    fill_linear, (fill_row, fill_col, fill_bias), fill_offset = fill_terms(incidence)
+
+    row, col, (use_quadratic, fill_quadratic) = _merge_quadratic(
+        len(use_linear),
+        np.concatenate([use_row, fill_row]),
+        np.concatenate([use_col, fill_col]),
+        [np.concatenate([use_bias, np.zeros(len(fill_bias))]), np.concatenate([np.zeros(len(use_bias)), fill_bias])],
+    )
+    return QuboParts(use_linear, fill_linear, row, col, use_quadratic, fill_quadratic, use_offset, fill_offset)
+
+
+def _expand(indptr, indices, rows, owners):
+    """CSR の行 rows の要素を並べ、それぞれの持ち主 owners（rows と同じ長さ）と組にして返す"""
+    lengths = indptr[rows + 1] - indptr[rows]
+    starts = np.repeat(indptr[rows] - np.cumsum(lengths) + lengths, lengths)
+    return np.repeat(owners, lengths), indices[starts + np.arange(lengths.sum())]
+
+
+def update_parts(parts, origins, incidence, placement_pieces, limits):
+    """前のモデルの係数 parts を、配置候補を足し引きした新しいモデルの係数に直す
+
+    origins[p] は新しい変数 p が前のモデルの何番の変数だったか（新しく増えた変数は -1）。
+    二次係数は「同じピースか」「何マス重なるか」だけで決まるので、残った変数同士の組は前の係数をそのまま使い、
+    増えた変数が関わる組だけを求める。一次係数と定数は枚数の上限やセル数で変わるので求め直す。
+    build_parts(incidence, placement_pieces, limits) と同じ BQM になる（二次の項の並びは異なる）。
+    """
+    origins = np.asarray(origins, dtype=np.int64)
+    placement_pieces = np.asarray(placement_pieces, dtype=np.int64)
+    limits = np.asarray(limits, dtype=np.float64)
+    num_variables = len(origins)
+
+    # 残った変数同士の組は番号を付け替えるだけ
+    new_of_old = np.full(len(parts.use_linear), -1, dtype=np.int64)
+    kept = np.flatnonzero(origins >= 0)
+    new_of_old[origins[kept]] = kept
+    row, col = new_of_old[parts.row], new_of_old[parts.col]
+    alive = (row >= 0) & (col >= 0)
+
+    # 増えた変数が関わる組：同じセルを覆う変数（重なり 1 マスごとに 2）と同じピースの変数（2）
+    added = np.flatnonzero(origins < 0)
+    is_added = origins < 0
+    owners, cells = _expand(incidence.indptr, incidence.indices, added, added)
+    fill_u, fill_v = _expand(incidence.cell_indptr, incidence.cell_indices, cells, owners)
+    order = np.argsort(placement_pieces, kind="stable")
+    piece_indptr = np.zeros(len(limits) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(placement_pieces, minlength=len(limits)), out=piece_indptr[1:])
+    use_u, use_v = _expand(piece_indptr, order, placement_pieces[added], added)
+    u = np.concatenate([use_u, fill_u])
+    v = np.concatenate([use_v, fill_v])
+    # 増えた変数同士の組は両側から数えられるので片側だけ残す
+    keep = (u != v) & (~is_added[v] | (u < v))
+    new_row, new_col, (new_use, new_fill) = _merge_quadratic(
+        num_variables, u[keep], v[keep],
+        [np.concatenate([np.full(len(use_u), 2.0), np.zeros(len(fill_u))])[keep],
+         np.concatenate([np.zeros(len(use_u)), np.full(len(fill_u), 2.0)])[keep]],
+    )
+
+    return QuboParts(
+        1.0 - 2.0 * limits[placement_pieces],
+        -incidence.sizes.astype(np.float64),
+        np.concatenate([row[alive], new_row]),
+        np.concatenate([col[alive], new_col]),
+        np.concatenate([parts.use_quadratic[alive], new_use]),
+        np.concatenate([parts.fill_quadratic[alive], new_fill]),
+        float(np.sum(limits ** 2)),
+        float(incidence.num_cells),
+    )
+
+
+def combine(parts, coef_use=10, coef_fill=20, labels=None):
+    """制約ごとの係数に重みを掛けて目的関数の BQM を組み立てる
+
+    labels: BQM の変数名。省略時は配置候補の番号
+    """
+    linear = coef_use * parts.use_linear + coef_fill * parts.fill_linear
+    quadratic = (parts.row, parts.col, coef_use * parts.use_quadratic + coef_fill * parts.fill_quadratic)
+    offset = coef_use * parts.use_offset + coef_fill * parts.fill_offset
+    return dimod.BinaryQuadraticModel.from_numpy_vectors(
+        linear, quadratic, offset, dimod.BINARY, variable_order=labels
+    )
+
+
+def build_bqm(incidence, placement_pieces, limits, coef_use=10, coef_fill=20, labels=None):
+    """配置候補とセルの接続関係から目的関数の BQM を直接組み立てる"""
+    return combine(build_parts(incidence, placement_pieces, limits), coef_use, coef_fill, labels)
+
+
+def _merge_quadratic(num_variables, row, col, biases):
+    """同じ変数の組に対する二次係数を合算する（dimod に重複した組を渡すと遅いため）
+
+    biases は row / col と同じ長さの係数の配列のリストで、それぞれを同じ組の並びで合算して返す。
+    """
+    lo = np.minimum(row, col)
+    hi = np.maximum(row, col)
+    keys, inverse = np.unique(lo * num_variables + hi, return_inverse=True)
+    merged = [np.bincount(inverse, weights=bias, minlength=len(keys)) for bias in biases]
+    return keys // num_variables, keys % num_variables, merged
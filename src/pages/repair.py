@@ -0,0 +1,63 @@
+import numpy as np
+
+
+def violation(cover, used, limits):
+    """充填のずれ Σ (cover − 1)² と使いすぎ Σ max(0, used − limit)² の和。0 なら成功"""
+    return int(np.sum((cover - 1) ** 2) + np.sum(np.maximum(used - limits, 0) ** 2))
+
+
+def repair(sample, incidence, placement_pieces, limits, movable=None, max_steps=200, tabu_tenure=7):
+    """タブーサーチで配置候補の出し入れを繰り返し、サンプルを成功する配置に近づける
+
+    各手では、覆われ方が 1 でないセルに掛かる配置候補と、使いすぎのピースの配置候補の反転だけを試す。
+    セルごとの被覆数とピースごとの使用数を持ち続けるので、1 手の評価は配置候補の面積に比例する。
+    直近 tabu_tenure 手で反転した配置候補は、それまでの最良を更新する場合を除いて反転しない。
+    成功する配置になれば 0/1 の配列を、max_steps 手で届かなければ None を返す。
+    """
+    placement_pieces = np.asarray(placement_pieces)
+    limits = np.asarray(limits, dtype=np.int64)
+    x = np.array(sample, dtype=np.int8)
+    movable = np.ones(len(x), dtype=bool) if movable is None else np.asarray(movable, dtype=bool)
+    cover = incidence.coverage(np.flatnonzero(x))
+    used = np.bincount(placement_pieces[x == 1], minlength=len(limits))
+    current = violation(cover, used, limits)
+    best = current
+    tabu_until = np.zeros(len(x), dtype=np.int64)
+
+    for step in range(max_steps):
+        if current == 0:
+            return x
+        bad_cells = np.flatnonzero(cover != 1)
+        candidates = set()
+        for j in bad_cells:
+            candidates.update(incidence.placements_of(j).tolist())
+        for k in np.flatnonzero(used > limits):
+            candidates.update(np.flatnonzero((placement_pieces == k) & (x == 1)).tolist())
+
+        best_move = None
+        for p in candidates:
+            if not movable[p]:
+                continue
+            s = 1 - 2 * int(x[p])
+            cells = incidence.cells_of(p)
+            k = placement_pieces[p]
+            delta = int(np.sum(2 * s * (cover[cells] - 1) + 1))
+            over, new_over = max(used[k] - limits[k], 0), max(used[k] + s - limits[k], 0)
+            delta += new_over ** 2 - over ** 2
+            if tabu_until[p] > step and current + delta >= best:
+                continue
+            if best_move is None or delta < best_move[0]:
+                best_move = (delta, p)
+        if best_move is None:
+            return None
+
+        delta, p = best_move
+        s = 1 - 2 * int(x[p])
+        x[p] += s
+        cover[incidence.cells_of(p)] += s
+        used[placement_pieces[p]] += s
+        current += delta
+        best = min(best, current)
+        tabu_until[p] = step + 1 + tabu_tenure
+
+    return x if current == 0 else None
@@ -0,0 +1,61 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+from contextlib import closing
+from pathlib import Path
+
+# 探索結果の保存先（リポジトリには含めない）
+DEFAULT_RESULT_CACHE_PATH = Path(__file__).resolve().parent.parent / "result_cache.sqlite"
+
+
+class ResultCache:
+    """探索結果をサーバー側の SQLite に置き、セッションにはキーだけを持たせる
+
+    キーは結果の内容のハッシュなので、同じ結果は1件にまとまる。件数が max_entries を超えたら、
+    古く使われたものから捨てる。ファイルなので、アプリを複数のプロセスで動かしても同じ結果を引ける。
+    """
+
+    def __init__(self, path=DEFAULT_RESULT_CACHE_PATH, max_entries=1000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # ファイルは最初に使うときに作る
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, data BLOB, used REAL)")
+        return db
+
+    def put(self, result):
+        """result（JSON にできる値）を保存してキーを返す"""
+        data = json.dumps(result, ensure_ascii=False, sort_keys=True).encode()
+        key = hashlib.sha256(data).hexdigest()
+        with self._lock, closing(self._connect()) as db, db:
+            db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (key, zlib.compress(data), time.time()))
+            db.execute(
+                "DELETE FROM results WHERE key NOT IN (SELECT key FROM results ORDER BY used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+        return key
+
+    def get(self, key):
+        """キーに対応する結果。無ければ（捨てられた・別のサーバーで作られた）None"""
+        if not key:
+            return None
+        with self._lock, closing(self._connect()) as db, db:
+            row = db.execute("SELECT data FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE results SET used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def __len__(self):
+        with self._lock, closing(self._connect()) as db:
+            return db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+RESULT_CACHE = ResultCache()
@@ -0,0 +1,87 @@
+import hashlib
+
+# 盤面 (rows × cols) のセル (r, c) を移す 8 通りの回転・反転
+_TRANSFORMS = [
+    lambda r, c, rows, cols: (r, c),
+    lambda r, c, rows, cols: (c, rows - 1 - r),
+    lambda r, c, rows, cols: (rows - 1 - r, cols - 1 - c),
+    lambda r, c, rows, cols: (cols - 1 - c, r),
+    lambda r, c, rows, cols: (r, cols - 1 - c),
+    lambda r, c, rows, cols: (rows - 1 - r, c),
+    lambda r, c, rows, cols: (c, r),
+    lambda r, c, rows, cols: (cols - 1 - c, rows - 1 - r),
+]
+
+
+def board_symmetries(cells, rows, cols):
+    """配置可能セルの集合を自分自身に移す回転・反転を、セル番号の置換（リスト）として返す"""
+    index = {cell: j for j, cell in enumerate(cells)}
+    symmetries = []
+    for transform in _TRANSFORMS:
+        mapped = [index.get(transform(r, c, rows, cols)) for r, c in cells]
+        if None not in mapped:
+            symmetries.append(mapped)
+    return symmetries
+
+
+def grid_cells(board_grid):
+    """配置可能セル (r, c) を行優先で並べたリスト"""
+    return [(r, c) for r, row in enumerate(board_grid) for c, cell in enumerate(row) if cell is not None]
+
+
+def grid_groups(grid, cells):
+    """結果の盤面を、配置の名前ごとのセル番号の集まりに分ける"""
+    groups = {}
+    for j, (r, c) in enumerate(cells):
+        groups.setdefault(grid[r][c], []).append(j)
+    return list(groups.values())
+
+
+class SolutionSet:
+    """成功した配置を、盤面の対称性と同じ形のピースの入れ替えを同一視してまとめる
+
+    配置は「各ピースが覆うセル番号の集まり」（盤面の分割）として比べる。ピースの番号を使わないので、
+    同じ形のピース同士を入れ替えた配置は同じものになる。symmetric=True で盤面が対称なら、回転・反転で
+    移した分割のうち最小のものを代表にしてハッシュを取る。異なる解は max_solutions 件まで保持し、
+    出現回数を数える。
+    """
+
+    def __init__(self, cells, rows, cols, max_solutions=100, symmetric=True):
+        self.max_solutions = max_solutions
+        identity = list(range(len(cells)))
+        self.symmetries = board_symmetries(cells, rows, cols) if symmetric else [identity]
+        self.solutions = {}
+        self.overflow = 0
+
+    def canonical_key(self, groups):
+        best = min(
+            tuple(sorted(tuple(sorted(mapping[j] for j in group)) for group in groups))
+            for mapping in self.symmetries
+        )
+        return hashlib.sha1(repr(best).encode()).hexdigest()
+
+    def add(self, groups, item, count=1):
+        """分割 groups の解を1つ数え、新しい解なら item を代表として残して True を返す
+
+        上限を超えた新しい解は残さず、出現回数だけを overflow に数える。
+        """
+        key = self.canonical_key(groups)
+        if key in self.solutions:
+            self.solutions[key][1] += count
+            return False
+        if len(self.solutions) >= self.max_solutions:
+            self.overflow += count
+            return False
+        self.solutions[key] = [item, count]
+        return True
+
+    @property
+    def full(self):
+        return len(self.solutions) >= self.max_solutions
+
+    def __len__(self):
+        return len(self.solutions)
+
+    def ranked(self):
+        """(代表, 出現回数) を出現回数の多い順に返す"""
+        return sorted(((item, count) for item, count in self.solutions.values()), key=lambda pair: -pair[1])
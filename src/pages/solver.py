@@ -1,15 +1,101 @@
+import dimod
+import itertools
 import json
+import math
+import time
 import numpy as np
-import pyqubo
 
 from collections import Counter
-from copy import deepcopy
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from copy import copy, deepcopy
 from dataclasses import dataclass
 from neal import SimulatedAnnealingSampler
 
 
+from .annealer import ExactCoverAnnealer, default_beta_range
+from .autotune import TuningStore, autotune, sampler_options as tuned_sampler_options
 from .board import Board
+from .decompose import decompose, stitch
+from .exact import ExactSearch, SearchBudgetExceeded, SearchCancelled
+from .incidence import Incidence
+from .model_cache import ModelCache
 from .piece import Piece
+from .presolve import presolve
+from .profiling import NULL_PROFILER, Profiler
+from .qubo import build_parts, combine, update_parts
+from .repair import repair
+from .solutions import SolutionSet, grid_cells, grid_groups
+
+# early_stop 時に一度にアニーリングする読み出し数の既定値
+DEFAULT_BATCH_SIZE = 10
+
+# early_stop しないときも、サンプル行列がこの読み出し数を超えないようにバッチに分ける
+MAX_BATCH_SIZE = 1000
+
+# 焼きなましで成功が出なかったとき、修復を試す成功以外のサンプル数の既定値
+DEFAULT_REPAIR_SAMPLES = 5
+
+# tune=True のとき、読み出しのうち設定の試行に回す割合
+TUNING_BUDGET_FRACTION = 0.3
+
+# 連結成分ごとの解をつなぎ合わせるとき、試す組み合わせの数の上限
+MAX_COMBINATIONS = 10_000
+
+# 前回の結果から始めるときのスイープ数（低い温度から短く焼きなます）
+WARM_START_SWEEPS = 100
+
+# 前回の配置が盤面の配置可能セルをこの割合以上覆うときだけ、前回の結果から短く焼きなます
+WARM_START_MIN_COVERAGE = 0.5
+
+# engine="auto" のとき、配置可能セルがこの数以下なら厳密探索を先に試す（8x8 盤面相当）
+AUTO_EXACT_MAX_CELLS = 64
+
+
+def split_reads(num_reads, batch_size):
+    """num_reads 回の読み出しを batch_size 回ずつのバッチに分ける"""
+    sizes = [batch_size] * (num_reads // batch_size)
+    if num_reads % batch_size:
+        sizes.append(num_reads % batch_size)
+    return sizes
+
+
+def batch_seeds(seed, num_batches):
+    """seed からバッチごとの乱数シードを決定的に作る（seed が None なら毎回異なる）"""
+    # neal が受け付けるシードは 0 以上 2^31 未満
+    return [int(s) >> 1 for s in np.random.SeedSequence(seed).generate_state(num_batches)]
+
+
+class NealSampler:
+    """BQM を neal でアニーリングする。ExactCoverAnnealer と同じ sample(num_reads, seed) で呼べるようにする"""
+
+    def __init__(self, bqm, **kwargs):
+        self.bqm = bqm
+        self.kwargs = kwargs
+
+    def sample(self, num_reads, seed=None, interrupt_function=None):
+        if self.bqm.num_variables == 0:
+            # 前処理ですべての配置候補が決まった
+            return dimod.SampleSet.from_samples(
+                (np.empty((num_reads, 0), dtype=np.int8), []), dimod.BINARY, energy=[self.bqm.offset] * num_reads
+            )
+        return SimulatedAnnealingSampler().sample(
+            self.bqm, num_reads=num_reads, seed=seed, interrupt_function=interrupt_function, **self.kwargs
+        )
+
+
+# 並列実行時、各ワーカープロセスは起動時に一度だけサンプラー（BQM などを含む）を受け取って保持する
+_worker_sampler = None
+
+
+def _init_worker(sampler):
+    global _worker_sampler
+    _worker_sampler = sampler
+
+
+def _sample_batch(num_reads, seed):
+    return _worker_sampler.sample(num_reads, seed=seed)
 
 @dataclass
 class Variable:
@@ -18,97 +104,812 @@ class Variable:
     name: str
 
     def __post_init__(self):
-        self.var = pyqubo.Binary(self.name)
+        self.cells = [
+            (self.position[0] + pr, self.position[1] + pc)
+            for pr, row in enumerate(self.piece_shape) for pc, v in enumerate(row) if v == 1
+        ]
+
+class Progress:
+    """実行中の進捗（読み出し数・速度・最良エネルギー・判定ごとの件数）を集計する"""
+
+    def __init__(self, num_reads):
+        self.num_reads = num_reads
+        self.reads_done = 0
+        self.best_energy = None
+        self.counts = Counter()
+        self.started = time.perf_counter()
+
+    def update(self, num_reads, energies, statuses):
+        self.reads_done += num_reads
+        if len(energies):
+            best = float(np.min(energies))
+            self.best_energy = best if self.best_energy is None else min(self.best_energy, best)
+        self.counts.update(statuses)
+        return self.snapshot()
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "reads_done": self.reads_done,
+            "num_reads": self.num_reads,
+            "reads_per_sec": self.reads_done / elapsed if elapsed > 0 else 0.0,
+            "best_energy": self.best_energy,
+            "counts": {k: self.counts[k] for k in ("成功", "空きあり", "使いすぎ")},
+        }
+
+
+class Results(Sequence):
+    """評価済みサンプルの列。要素は (判定, 盤面) で、盤面は取り出したときに初めて組み立てる
+
+    サンプルは置いた配置候補の番号の配列として持ち、同じサンプルは1つにまとめて出現回数 counts を数える。
+    そのため持つ量は盤面の広さ × 読み出し数ではなく、異なるサンプルの数 × 置いたピースの数で決まる。
+    """
+
+    def __init__(self, solver):
+        self.solver = solver
+        self.statuses = []
+        self.placements = []
+        self.counts = []
+        self._index = {}
+
+    def extend(self, statuses, samples):
+        for status, sample in zip(statuses, samples):
+            placements = np.flatnonzero(sample).astype(np.int32)
+            key = placements.tobytes()
+            i = self._index.get(key)
+            if i is None:
+                self._index[key] = len(self.statuses)
+                self.statuses.append(status)
+                self.placements.append(placements)
+                self.counts.append(1)
+            else:
+                self.counts[i] += 1
+
+    @property
+    def total(self):
+        """まとめる前のサンプル数"""
+        return sum(self.counts)
+
+    def status_counts(self):
+        """判定ごとの出現回数（まとめたサンプルは出現回数で数える）"""
+        counts = Counter()
+        for status, n in zip(self.statuses, self.counts):
+            counts[status] += n
+        return counts
+
+    def sample(self, i):
+        """i 番目のサンプルを配置候補ごとの 0/1 の配列に戻す"""
+        sample = np.zeros(len(self.solver.placements), dtype=np.int8)
+        sample[self.placements[i]] = 1
+        return sample
+
+    def __len__(self):
+        return len(self.statuses)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self.statuses[i], self.solver.materialize(self.statuses[i], self.placements[i])
 
-    def is_related_position(self, r, c):
-        r_diff = r - self.position[0]
-        c_diff = c - self.position[1]
-        if 0<=r_diff<len(self.piece_shape) and 0<=c_diff<len(self.piece_shape[0]) and self.piece_shape[r_diff][c_diff]==1:
-            return True
-        return False
 
 class Solver:
-    def __init__(self, board_grid, piece_grids, piece_ids, limits):
+    """盤面とピースから配置候補と QUBO を組み立て、アニーリングの結果を評価する
+
+    base に同じ大きさの盤面の Solver を渡すと、そこから差分だけを組み立て直す。セルを切り替えたときは
+    そのセルに掛かる配置候補だけを走査し直し、ピースを足し引きしたときはそのピースの配置候補だけを足し引きする。
+    QUBO の係数も base の係数から、増えた配置候補が関わる項だけを求めて作る（qubo.update_parts）。
+    配置候補の並びと名前、できる BQM は base なしで組み立てたものと同じになる。
+    """
+
+    def __init__(self, board_grid, piece_grids, piece_ids, limits, presolve=False, profiler=NULL_PROFILER,
+                 base=None):
         self.original_grid = board_grid
         self.board = Board(board_grid)
         self.limits = limits
+        self.profiler = profiler
+        if base is not None and (base.board.rows, base.board.cols) != (self.board.rows, self.board.cols):
+            base = None
 
-        self.pieces = [Piece(g) for g in piece_grids]
+        with profiler.phase("向きの列挙"):
+            self.pieces = [Piece(g) for g in piece_grids]
+            if base is not None:
+                # 形の変わっていないピースは base のものを使い、向きの並びを揃える
+                base_pieces = {
+                    (piece_id, str(piece.original_shape)): piece for piece_id, piece in zip(base.piece_ids, base.pieces)
+                }
+                self.pieces = [
+                    base_pieces.get((piece_id, str(piece.original_shape)), piece)
+                    for piece_id, piece in zip(piece_ids, self.pieces)
+                ]
         self.piece_ids = piece_ids
 
-        self.variables = {}
-        for piece_id, piece in zip(self.piece_ids, self.pieces):
-            self.variables[piece_id] = []
-            local_idx = 1
-            for variation in piece.variations:
-                for pos in self.board.scan_position_to_place(variation):
-                    self.variables[piece_id].append(Variable(pos, variation, f"{piece_id}-{local_idx}"))
-                    local_idx += 1
+        with profiler.phase("配置候補の走査"):
+            self.variables = {}
+            # 配置候補ごとの base での番号（新しく走査したものは -1）
+            origins = []
+            base_pieces = {id(piece) for piece in base.pieces} if base is not None else set()
+            for piece_id, piece in zip(self.piece_ids, self.pieces):
+                if id(piece) in base_pieces:
+                    self.variables[piece_id], piece_origins = self._rescan(base, piece_id, piece)
+                else:
+                    self.variables[piece_id], piece_origins = self._scan(piece_id, piece), None
+                origins.extend(piece_origins or [-1] * len(self.variables[piece_id]))
+            self.origins = np.array(origins, dtype=np.int64)
+        with profiler.phase("接続関係の構築"):
+            self._build_incidence()
+        profiler.set("配置候補", len(self.placements))
+        profiler.set("配置可能セル", len(self.cell_index))
+        if base is not None:
+            profiler.set("再利用した配置候補", int(np.count_nonzero(self.origins >= 0)))
+
+        # QUBO の変数にする配置候補と、その接続関係・枚数の上限（前処理をすると小さくなる）
+        self.presolved = None
+        self.model_placements = np.arange(len(self.placements))
+        self.model_incidence = self.incidence
+        self.model_limits = list(limits)
+        if presolve:
+            with profiler.phase("前処理"):
+                self.apply_presolve()
 
-        self.conditions_use = []
-        for variable_list, limit in zip(self.variables.values(), limits):
-            self.conditions_use.append((sum([p.var for p in variable_list])-limit)**2)
+        # base の QUBO の係数と、QUBO の変数ごとの base での変数の番号（qubo_parts() で使ったら捨てる）
+        self._base_parts = None
+        if base is not None and base.parts is not None and np.any(self.origins >= 0):
+            base_model = np.full(len(base.placements) + 1, -1, dtype=np.int64)
+            base_model[base.model_placements] = np.arange(len(base.model_placements))
+            # origins の -1 は base_model の末尾の -1 を引く
+            self._base_parts = (base.parts, base_model[self.origins[self.model_placements]])
 
-        self.conditions_fill = []
+    def _scan(self, piece_id, piece):
+        variables = []
+        for variation in piece.variations:
+            for pos in self.board.scan_position_to_place(variation):
+                variables.append(Variable(pos, variation, f"{piece_id}-{len(variables) + 1}"))
+        return variables
+
+    def _rescan(self, base, piece_id, piece):
+        """base の配置候補のうち切り替わったセルに掛からないものを残し、そのセルに掛かる位置だけを走査し直す"""
+        changed_mask = base.board.free ^ self.board.free
+        changed = [
+            (r, c) for r in range(self.board.rows) for c in range(self.board.cols)
+            if changed_mask & self.board.cell_mask(r, c)
+        ]
+        start = base.placement_index[base.variables[piece_id][0].name] if base.variables[piece_id] else 0
+        old = {}
+        for p, v in enumerate(base.variables[piece_id], start=start):
+            old.setdefault(id(v.piece_shape), []).append((v.position, p, v))
+
+        variables, origins = [], []
+        for variation in piece.variations:
+            positions = {
+                pos: (p, v) for pos, p, v in old.get(id(variation), [])
+                if not self.board.placement_mask(variation, *pos) & changed_mask
+            }
+            cells = [(pr, pc) for pr, row in enumerate(variation) for pc, x in enumerate(row) if x == 1]
+            for r, c in changed:
+                for pr, pc in cells:
+                    pos = (r - pr, c - pc)
+                    if pos not in positions and self.board.can_place(variation, *pos):
+                        positions[pos] = (-1, None)
+            for pos in sorted(positions):
+                p, v = positions[pos]
+                name = f"{piece_id}-{len(variables) + 1}"
+                if v is None:
+                    v = Variable(pos, variation, name)
+                elif v.name != name:
+                    v = copy(v)
+                    v.name = name
+                variables.append(v)
+                origins.append(p)
+        return variables, origins
+
+    def _build_incidence(self):
+        # 配置可能セルに通し番号を振り、各配置候補が覆うセル番号を求める
+        self.cell_index = {}
         for r in range(self.board.rows):
             for c in range(self.board.cols):
-                if self.board.grid[r][c] is None:
-                    continue
-                self.conditions_fill.append(
-                    (sum([v.var for variables in self.variables.values() for v in variables if v.is_related_position(r, c)])-1)**2
-                )
-        
-    def run(self, num_reads, coef_use=10, coef_fill=20, early_stop=True):
-        objective = coef_use*sum(self.conditions_use) + coef_fill*sum(self.conditions_fill)
-        bqm = objective.compile().to_bqm()
-        sampler = SimulatedAnnealingSampler()
-        _results = sampler.sample(bqm, num_reads=num_reads)
-
-        self.results = []
-        for result in _results:
-            evaluated = self.__impose_conditions(result)
-            self.results.append(evaluated)
-            if early_stop and evaluated[0] == "成功":
-                break
+                if self.board.grid[r][c] is not None:
+                    self.cell_index[(r, c)] = len(self.cell_index)
 
-    def __impose_conditions(self, result):
-        board = Board(deepcopy(self.original_grid))
+        # 配置候補に通し番号を振り、配置候補 ⇔ セルの接続関係を一度だけ作る
+        self.placements = [v for variable_list in self.variables.values() for v in variable_list]
+        self.placement_names = [v.name for v in self.placements]
+        self.placement_index = {name: p for p, name in enumerate(self.placement_names)}
+        self.placement_pieces = np.array(
+            [piece_no for piece_no, variable_list in enumerate(self.variables.values()) for _ in variable_list],
+            dtype=np.int64
+        )
+        self.incidence = Incidence.from_lists(
+            [[self.cell_index[cell] for cell in v.cells] for v in self.placements], len(self.cell_index)
+        )
+        # サンプル行列 (サンプル × 配置候補) に掛けて、使用数と被覆数をまとめて求めるための行列
+        self.piece_matrix = np.zeros((len(self.placements), len(self.piece_ids)), dtype=np.float32)
+        self.piece_matrix[np.arange(len(self.placements)), self.placement_pieces] = 1
+        self.cover_matrix = self.incidence.to_dense(np.float32)
+        self.parts = None
+
+    def apply_presolve(self):
+        """前処理で固定できた配置候補を QUBO の変数から外す"""
+        neighbors = [
+            [self.cell_index[n] for n in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)) if n in self.cell_index]
+            for r, c in self.cell_index
+        ]
+        self.presolved = presolve(
+            self.incidence, self.placement_pieces, self.limits, neighbors, [piece.size for piece in self.pieces]
+        )
+        self._base_parts = None
+        fixed = set(self.presolved.forced) | self.presolved.removed
+        self.model_placements = np.array([p for p in range(len(self.placements)) if p not in fixed], dtype=np.int64)
+
+        covered = self.incidence.coverage(self.presolved.forced) > 0
+        cell_map = {j: i for i, j in enumerate(np.flatnonzero(~covered))}
+        self.model_incidence = Incidence.from_lists(
+            [[cell_map[j] for j in self.incidence.cells_of(p)] for p in self.model_placements], len(cell_map)
+        )
+        used = np.bincount(self.placement_pieces[self.presolved.forced], minlength=len(self.piece_ids))
+        self.model_limits = [int(limit) - int(n) for limit, n in zip(self.limits, used)]
+        self.parts = None
 
-        # piece_id ごとの使用数を集計（piece_id の順序を保つ）
-        used = {pid: 0 for pid in self.piece_ids}
-        for var_name, num in result.items():
-            idx1, _ = var_name.split("-")
-            used[int(idx1)] += num
-
-        # 使用数制約チェック
-        for pid, limit in zip(self.piece_ids, self.limits):
-            if used[pid] > limit:
-                return "使いすぎ", deepcopy(board.grid)
-
-        # 配置を試みる（衝突があれば「空きあり」として扱い、配置できた分は反映）
-        conflict = False
-        for var_name, num in result.items():
-            if num == 1:
-                idx1, idx2 = var_name.split("-")
-                v = self.variables[int(idx1)][int(idx2) - 1]
-                r, c = v.position
-                if board.can_place(v.piece_shape, r, c):
-                    board.fill(v, r, c)
+    @property
+    def model_labels(self):
+        return [self.placement_names[p] for p in self.model_placements]
+
+    @property
+    def nbytes(self):
+        """モデルキャッシュの大きさの見積もりに使う、主な配列のバイト数"""
+        nbytes = self.piece_matrix.nbytes + self.cover_matrix.nbytes
+        nbytes += sum(a.nbytes for a in (self.incidence.indptr, self.incidence.indices,
+                                         self.incidence.cell_indptr, self.incidence.cell_indices))
+        if self.parts is not None:
+            nbytes += self.parts.nbytes
+        return nbytes
+
+    def qubo_parts(self):
+        """制約ごとの係数。一度だけ求め、係数が変わったときは重みを掛け直すだけにする"""
+        if self.parts is None:
+            with self.profiler.phase("制約の構築"):
+                if self._base_parts is not None:
+                    base_parts, origins = self._base_parts
+                    self.parts = update_parts(
+                        base_parts, origins, self.model_incidence, self.placement_pieces[self.model_placements],
+                        self.model_limits
+                    )
+                    self._base_parts = None
                 else:
-                    conflict = True
+                    self.parts = build_parts(
+                        self.model_incidence, self.placement_pieces[self.model_placements], self.model_limits
+                    )
+        return self.parts
+
+    def build_bqm(self, coef_use=10, coef_fill=20):
+        return combine(self.qubo_parts(), coef_use, coef_fill, labels=self.model_labels)
+
+    def make_sampler(self, sampler="neal", coef_use=10, coef_fill=20, **kwargs):
+        """sampler="neal" なら BQM を neal で、"exact_cover" なら ExactCoverAnnealer でアニーリングする"""
+        self.profiler.set("変数", len(self.model_placements))
+        if sampler == "neal":
+            with self.profiler.phase("BQM の組み立て"):
+                bqm = self.build_bqm(coef_use=coef_use, coef_fill=coef_fill)
+            self.profiler.set("二次の項", bqm.num_interactions)
+            return NealSampler(bqm, **kwargs)
+        if sampler == "exact_cover":
+            return ExactCoverAnnealer(
+                self.model_incidence, self.placement_pieces[self.model_placements], self.model_limits,
+                coef_use=coef_use, coef_fill=coef_fill, labels=self.model_labels, **kwargs
+            )
+        raise ValueError(f"未知のサンプラーです: {sampler}")
+
+    def iter_samples(self, sampler, num_reads, batch_size, seed=None, workers=None, cancel_event=None):
+        """batch_size 回ずつアニーリングし、終わったバッチから順に SampleSet を返す
+
+        workers を指定するとバッチをプロセスプールで並列に実行する。シードはバッチごとに決まるので、
+        並列でも逐次でも同じ seed なら同じ結果を同じ順序で返す。途中で閉じると未実行のバッチは取り消す。
+        cancel_event がセットされると、逐次ならバッチの途中の読み出しの切れ目で、並列ならバッチの切れ目で止まる。
+        """
+        sizes = split_reads(num_reads, batch_size)
+        seeds = batch_seeds(seed, len(sizes))
+        if not workers or workers <= 1:
+            interrupt = cancel_event.is_set if cancel_event is not None else None
+            for size, batch_seed in zip(sizes, seeds):
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                yield sampler.sample(size, seed=batch_seed, interrupt_function=interrupt)
+            return
 
-        if conflict or np.any(np.array(board.grid) == 0):
-            return "空きあり", deepcopy(board.grid)
-        return "成功", deepcopy(board.grid)
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(sampler,))
+        try:
+            futures = [pool.submit(_sample_batch, size, batch_seed) for size, batch_seed in zip(sizes, seeds)]
+            for future in futures:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                yield future.result()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
 
-def solve(board_grid, pieces, piece_ids, limit_nums, num_reads, coef_use=10, coef_fill=20, early_stop=True):
-    solver = Solver(board_grid, pieces, piece_ids, limit_nums)
-    solver.run(num_reads, coef_use=coef_use, coef_fill=coef_fill, early_stop=early_stop)
+    def initial_state_from_grid(self, grid):
+        """前回の結果の盤面を、この問題の配置候補の 0/1 の配列に写す
 
-    summary = Counter([r[0] for r in solver.results])
+        盤面の配置ごとに、同じピースで同じセルを覆う配置候補を探す。盤面が変わって置けなくなった配置や、
+        無くなったピースの配置は捨てる。(配列, 引き継いだ配置の数, 捨てた配置の数) を返す。
+        """
+        lookup = {
+            (self.piece_ids[k], frozenset(v.cells)): p
+            for p, (v, k) in enumerate(zip(self.placements, self.placement_pieces))
+        }
+        groups = {}
+        for r, row in enumerate(grid):
+            for c, cell in enumerate(row):
+                if isinstance(cell, str):
+                    groups.setdefault(cell, set()).add((r, c))
+        state = np.zeros(len(self.placements), dtype=np.int8)
+        kept = 0
+        for name, cells in groups.items():
+            p = lookup.get((int(name.split("-")[0]), frozenset(cells)))
+            if p is not None:
+                state[p] = 1
+                kept += 1
+        return state, kept, len(groups) - kept
+
+    def warm_start_options(self, initial_state, sampler, coef_use=10, coef_fill=20):
+        """initial_state から低い温度で短く焼きなますためのサンプラーの引数"""
+        # 通常の終わりの逆温度の前後 (1/2 倍 → 2 倍) だけを回し、引き継いだ配置を大きく崩さずに直す
+        _, cold = default_beta_range(self.model_incidence, self.model_limits, coef_use, coef_fill)
+        options = {"num_sweeps": WARM_START_SWEEPS, "beta_range": (cold / 2, cold * 2)}
+        state = np.asarray(initial_state, dtype=np.int8)[self.model_placements]
+        if sampler == "exact_cover":
+            options["initial_state"] = state
+        elif len(state):
+            options["initial_states"] = (state[None, :], self.model_labels)
+            options["initial_states_generator"] = "tile"
+        return options
+
+    def run(self, num_reads, coef_use=10, coef_fill=20, early_stop=True, batch_size=None, seed=None, workers=None,
+            cancel_event=None, progress=None, sampler="neal", sampler_options=None, initial_state=None):
+        """num_reads 回アニーリングして self.results に評価結果を貯める
+
+        progress を渡すと、バッチを評価するたびに進捗 (Progress.snapshot) を引数に呼び出す。
+        sampler_options は make_sampler に渡す（num_sweeps や beta_range など）。
+        initial_state（配置候補ごとの 0/1）を渡すと、すべての読み出しをそこから低い温度で短く焼きなます。
+        """
+        if initial_state is not None:
+            sampler_options = {
+                **self.warm_start_options(initial_state, sampler, coef_use=coef_use, coef_fill=coef_fill),
+                **(sampler_options or {}),
+            }
+        batch_sampler = self.make_sampler(sampler, coef_use=coef_use, coef_fill=coef_fill, **(sampler_options or {}))
+        if batch_size is None:
+            if early_stop:
+                batch_size = max(min(DEFAULT_BATCH_SIZE, num_reads), 1)
+            else:
+                batch_size = min(max(-(-num_reads // (workers or 1)), 1), MAX_BATCH_SIZE)
+
+        self.results = Results(self)
+        self.reads_done = 0
+        tracker = Progress(num_reads)
+        batches = self.iter_samples(
+            batch_sampler, num_reads, batch_size, seed=seed, workers=workers, cancel_event=cancel_event
+        )
+        with closing(batches):
+            while True:
+                with self.profiler.phase("アニーリング"):
+                    sampleset = next(batches, None)
+                if sampleset is None:
+                    return
+                self.reads_done += len(sampleset)
+                with self.profiler.phase("評価"):
+                    samples = self.sample_matrix(sampleset)
+                    statuses = self.evaluate(samples)
+                self.profiler.count("評価したサンプル", len(statuses))
+                found = early_stop and "成功" in statuses
+                stop = statuses.index("成功") + 1 if found else len(statuses)
+                self.results.extend(statuses[:stop], samples[:stop])
+                if progress is not None:
+                    progress(tracker.update(len(sampleset), sampleset.record.energy, statuses[:stop]))
+                if found:
+                    return
+
+    def sample_matrix(self, sampleset):
+        """SampleSet をエネルギーの低い順に並べ、列を配置候補の番号順にそろえた 0/1 行列にする"""
+        record = sampleset.record
+        order = np.argsort(record.energy, kind="stable")
+        columns = [self.placement_index[v] for v in sampleset.variables]
+        samples = np.zeros((len(record), len(self.placements)), dtype=np.int8)
+        samples[:, columns] = record.sample[order]
+        if self.presolved is not None:
+            samples[:, self.presolved.forced] = 1
+        return samples
+
+    def evaluate(self, samples):
+        """サンプル行列の各行を「成功」「空きあり」「使いすぎ」に一括で判定する"""
+        x = samples.astype(np.float32)
+        used = x @ self.piece_matrix
+        coverage = x @ self.cover_matrix
+
+        overused = np.any(used > np.asarray(self.limits, dtype=np.float32), axis=1)
+        # 全セルがちょうど1回ずつ覆われていれば成功（衝突・空きがあれば「空きあり」）
+        exact = np.all(coverage == 1, axis=1)
+        statuses = np.where(overused, "使いすぎ", np.where(exact, "成功", "空きあり"))
+        return statuses.tolist()
+
+    def repair_results(self, max_samples=DEFAULT_REPAIR_SAMPLES, **options):
+        """成功以外のサンプルのうち制約違反の少ない max_samples 件をタブーサーチで修復する
+
+        修復できたサンプルは判定「成功」として self.results の末尾に足し、その件数を返す。
+        前処理で固定した配置候補は動かさない。options は repair() に渡す（max_steps など）。
+        """
+        candidates = [i for i, status in enumerate(self.results.statuses) if status != "成功"]
+        if not candidates or max_samples <= 0:
+            return 0
+        samples = np.array([self.results.sample(i) for i in candidates])
+        x = samples.astype(np.float32)
+        over = np.maximum(x @ self.piece_matrix - np.asarray(self.limits, dtype=np.float32), 0)
+        violations = np.sum((x @ self.cover_matrix - 1) ** 2, axis=1) + np.sum(over ** 2, axis=1)
+
+        movable = np.zeros(len(self.placements), dtype=bool)
+        movable[self.model_placements] = True
+        repaired = 0
+        with self.profiler.phase("修復"):
+            for row in np.argsort(violations, kind="stable")[:max_samples]:
+                sample = repair(samples[row], self.incidence, self.placement_pieces, self.limits,
+                                movable=movable, **options)
+                if sample is not None:
+                    self.results.extend(["成功"], [sample])
+                    repaired += 1
+        return repaired
+
+    def search_exact(self, max_nodes=1_000_000, time_limit=10.0, cancel_event=None):
+        """Algorithm X で解を探す。(判定, 盤面, 探索ノード数) を返す"""
+        search = ExactSearch(self.incidence, self.placement_pieces, self.limits,
+                             max_nodes=max_nodes, time_limit=time_limit, cancel_event=cancel_event)
+        with self.profiler.phase("厳密探索"):
+            status, solution = search.search()
+        self.profiler.count("探索ノード", search.nodes)
+        if solution is None:
+            return status, deepcopy(self.original_grid), search.nodes
+        return status, self.materialize(status, solution), search.nodes
+
+    def solution_set(self, max_solutions=100, symmetric=True):
+        return SolutionSet(list(self.cell_index), self.board.rows, self.board.cols, max_solutions, symmetric)
+
+    def add_solution(self, solutions, placements, count=1):
+        """配置候補の番号の列を解として solutions に数える"""
+        groups = [self.incidence.cells_of(p) for p in placements]
+        return solutions.add(groups, list(placements), count)
+
+    def solution_list(self, solutions):
+        """SolutionSet を出現回数の多い順に {"盤面": 盤面, "回数": 出現回数} のリストにする"""
+        return [{"盤面": self.materialize("成功", placements), "回数": count}
+                for placements, count in solutions.ranked()]
+
+    def enumerate_exact(self, max_solutions=100, symmetric=True, max_nodes=1_000_000, time_limit=10.0,
+                        cancel_event=None):
+        """Algorithm X で解を列挙し、(判定, SolutionSet, 探索ノード数) を返す
+
+        異なる解が max_solutions 件集まるか、予算を使い切るか、cancel_event がセットされると止める。
+        解が1つも無ければ判定は「解なし」（探索を終えた）か「打ち切り」か「中断」になる。
+        """
+        search = ExactSearch(self.incidence, self.placement_pieces, self.limits,
+                             max_nodes=max_nodes, time_limit=time_limit, cancel_event=cancel_event)
+        solutions = self.solution_set(max_solutions, symmetric)
+        status = "解なし"
+        with self.profiler.phase("厳密探索"):
+            try:
+                for solution in search.iter_solutions():
+                    self.add_solution(solutions, solution)
+                    if solutions.full:
+                        break
+            except SearchBudgetExceeded:
+                status = "打ち切り"
+            except SearchCancelled:
+                status = "中断"
+        self.profiler.count("探索ノード", search.nodes)
+        return ("成功" if len(solutions) else status), solutions, search.nodes
+
+    def collect_solutions(self, max_solutions=100, symmetric=True):
+        """self.results の成功をまとめた SolutionSet を返す"""
+        solutions = self.solution_set(max_solutions, symmetric)
+        with self.profiler.phase("解の整理"):
+            for status, placements, count in zip(self.results.statuses, self.results.placements, self.results.counts):
+                if status == "成功":
+                    self.add_solution(solutions, placements, count)
+        return solutions
+
+    def materialize(self, status, placements):
+        """置いた配置候補の番号の列から盤面を組み立てる（衝突する配置は飛ばし、置けた分だけ反映する）"""
+        board = Board(deepcopy(self.original_grid))
+        if status == "使いすぎ":
+            return board.grid
+
+        occupied = np.zeros(self.incidence.num_cells, dtype=bool)
+        for p in placements:
+            cells = self.incidence.cells_of(p)
+            if not occupied[cells].any():
+                occupied[cells] = True
+                v = self.placements[p]
+                board.fill(v, *v.position)
+        return board.grid
+
+MODEL_CACHE = ModelCache()
+TUNING_STORE = TuningStore()
+
+
+def build_solver(board_grid, pieces, piece_ids, limit_nums, cache=MODEL_CACHE, presolve=True,
+                 profiler=NULL_PROFILER):
+    """Solver を組み立てる。cache にあればそれを使い、結果だけを持つ浅いコピーを返す
+
+    cache に無ければ、最後に使ったモデルを土台にして差分だけを組み立て直す。
+    """
+    if cache is None:
+        return Solver(board_grid, pieces, piece_ids, limit_nums, presolve=presolve, profiler=profiler)
+
+    built = []
+
+    def build():
+        built.append(True)
+        solver = Solver(board_grid, pieces, piece_ids, limit_nums, presolve=presolve, profiler=profiler,
+                        base=cache.latest())
+        solver.qubo_parts()
+        # キャッシュに残す方は、呼び出しごとの計測に書き込まないようにする
+        solver.profiler = NULL_PROFILER
+        return solver
+
+    key = cache.key(board_grid, pieces, piece_ids, limit_nums, presolve=presolve)
+    solver = copy(cache.get(key, build))
+    if not built:
+        profiler.count("モデルキャッシュのヒット")
+    solver.profiler = profiler
+    return solver
+
+
+def _add_solutions(summary, solver, solutions):
+    """異なる解の数と一覧を集計に入れ、一覧を返す"""
+    solution_list = solver.solution_list(solutions)
+    summary["異なる解"] = len(solutions)
+    if solutions.overflow:
+        summary["上限を超えた解"] = solutions.overflow
+    summary["解の一覧"] = solution_list
+    return solution_list
+
+
+def _set_sample_rate(profiler):
+    evaluated = profiler.counters.get("評価したサンプル", 0)
+    seconds = profiler.timings.get("アニーリング", 0.0) + profiler.timings.get("評価", 0.0)
+    if evaluated and seconds > 0:
+        profiler.set("サンプル/秒", evaluated / seconds)
+
+
+def solve(board_grid, pieces, piece_ids, limit_nums, num_reads, coef_use=10, coef_fill=20, early_stop=True,
+          batch_size=None, seed=None, workers=None, cancel_event=None, progress=None, sampler="neal",
+          sampler_options=None, presolve=True, engine="anneal", exact_options=None,
+          repair_samples=DEFAULT_REPAIR_SAMPLES, repair_options=None, tune=False, tuning_store=TUNING_STORE,
+          profile=False, max_solutions=0, symmetric=True, previous=None):
+    """盤面を解き、(判定, 盤面, 集計の JSON) を返す
+
+    engine="anneal" は焼きなまし、"exact" は Algorithm X による厳密探索、"auto" は小さな盤面
+    （配置可能セルが AUTO_EXACT_MAX_CELLS 以下）なら厳密探索を試し、予算内に終わらなければ焼きなましに切り替える。
+    焼きなましで成功が出なかったときは、惜しいサンプルを repair_samples 件までタブーサーチで修復する。
+    tune=True なら読み出しの TUNING_BUDGET_FRACTION までを使って係数・スイープ数・逆温度を自動で選び
+    （tuning_store に似た問題の設定があればそれを使う）、残りの読み出しをその設定で行う。
+    読み出しが少なくて試行の1巡にも足りなければ調整はせず、渡された係数と sampler_options のまま解く。
+    profile=True なら段階ごとの時間とカウンタを集計の "プロファイル" に入れ、ログにも書く。
+    max_solutions > 0 なら解を集める。焼きなましは打ち切らずに全読み出しを行い、厳密探索は解を列挙して、
+    対称性で同一視した異なる解を最大 max_solutions 件、集計の "解の一覧" に入れる
+    （symmetric=False なら盤面の回転・反転は同一視せず、同じ形のピースの入れ替えだけを同一視する）。
+    previous に前回の結果の盤面を渡すと、焼きなましを前回の配置のうち今も置けるものから始める
+    （それらが配置可能セルの WARM_START_MIN_COVERAGE 未満しか覆わなければ、通常どおり焼きなます）。
+    """
+    profiler = Profiler() if profile else NULL_PROFILER
+    started = time.perf_counter()
+
+    def finish(status, grid, summary):
+        if profile:
+            profiler.timings["全体"] = time.perf_counter() - started
+            _set_sample_rate(profiler)
+            summary["プロファイル"] = profiler.to_dict()
+            profiler.log("solve", status=status, engine=engine, sampler=sampler, num_reads=num_reads)
+        return status, grid, json.dumps(summary)
+
+    solver = build_solver(board_grid, pieces, piece_ids, limit_nums, presolve=presolve, profiler=profiler)
+    if solver.presolved is not None and solver.presolved.infeasible:
+        # 前処理で埋められないセルが見つかった。焼きなましても成功しないので探索しない
+        return finish("解なし", deepcopy(board_grid),
+                      {"解なし": 1, "前処理で減らした変数": solver.presolved.num_eliminated})
+    if engine == "auto":
+        engine = "exact" if len(solver.cell_index) <= AUTO_EXACT_MAX_CELLS else "anneal"
+        fallback = True
+    else:
+        fallback = False
+    if engine == "exact" and max_solutions:
+        status, solutions, nodes = solver.enumerate_exact(max_solutions, symmetric, cancel_event=cancel_event,
+                                                          **(exact_options or {}))
+        if status != "打ち切り" or not fallback:
+            summary = {status: 1, "探索ノード": nodes}
+            solution_list = _add_solutions(summary, solver, solutions)
+            grid = solution_list[0]["盤面"] if solution_list else deepcopy(board_grid)
+            return finish(status, grid, summary)
+    elif engine == "exact":
+        status, grid, nodes = solver.search_exact(cancel_event=cancel_event, **(exact_options or {}))
+        if status != "打ち切り" or not fallback:
+            return finish(status, grid, {status: 1, "探索ノード": nodes})
+    elif engine != "anneal":
+        raise ValueError(f"未知のエンジンです: {engine}")
+
+    tuning = None
+    if tune:
+        with profiler.phase("自動調整"):
+            tuning = autotune(solver, int(num_reads * TUNING_BUDGET_FRACTION), sampler=sampler, store=tuning_store,
+                              seed=seed, workers=workers, cancel_event=cancel_event)
+        if tuning.params is not None:
+            coef_use, coef_fill = tuning.params["coef_use"], tuning.params["coef_fill"]
+            sampler_options = {**(sampler_options or {}), **tuned_sampler_options(solver, tuning.params)}
+            num_reads = max(num_reads - tuning.reads, 0)
+
+    initial_state = None
+    if previous is not None:
+        initial_state, kept, dropped = solver.initial_state_from_grid(previous)
+        covered = np.count_nonzero(solver.incidence.coverage(np.flatnonzero(initial_state)))
+        warm_start = kept > 0 and covered >= WARM_START_MIN_COVERAGE * len(solver.cell_index)
+        if not warm_start:
+            # ほとんど引き継げないなら、空の状態からの急冷になるだけなので通常の焼きなましにする
+            initial_state = None
+
+    if max_solutions:
+        early_stop = False
+    solver.run(num_reads, coef_use=coef_use, coef_fill=coef_fill, early_stop=early_stop,
+               batch_size=batch_size, seed=seed, workers=workers, cancel_event=cancel_event, progress=progress,
+               sampler=sampler, sampler_options=sampler_options, initial_state=initial_state)
+    if tuning is not None and tuning.success_sample is not None and "成功" not in solver.results.statuses:
+        # 試行中に見つかった成功も結果に残す
+        solver.results.extend(["成功"], [tuning.success_sample])
+    cancelled = cancel_event is not None and cancel_event.is_set()
+    repaired = 0
+    if "成功" not in solver.results.statuses and not cancelled:
+        repaired = solver.repair_results(repair_samples, **(repair_options or {}))
+
+    statuses = solver.results.statuses
+    summary = solver.results.status_counts()
+    summary["異なるサンプル"] = len(statuses)
+    if repaired:
+        summary["修復で成功"] = repaired
+    if previous is not None:
+        summary["前回から引き継いだ配置"] = kept
+        summary["前回から捨てた配置"] = dropped
+        if initial_state is None:
+            summary["前回の結果を使わなかった"] = 1
+    if tuning is not None and tuning.params is None:
+        summary["自動調整を行わなかった"] = 1
+    elif tuning is not None:
+        summary["自動調整の試行読み出し"] = tuning.reads
+        summary["coef_use (自動調整)"] = coef_use
+        summary["coef_fill (自動調整)"] = coef_fill
+        summary["num_sweeps (自動調整)"] = tuning.params["num_sweeps"]
+    if solver.presolved is not None:
+        summary["前処理で減らした変数"] = solver.presolved.num_eliminated
+    if max_solutions:
+        _add_solutions(summary, solver, solver.collect_solutions(max_solutions, symmetric))
+    if not statuses:
+        # 最初の読み出しが終わる前に取り消された
+        return finish("中断", None, summary)
     for priority in ("成功", "空きあり", "使いすぎ"):
-        for result in solver.results:
-            if result[0] == priority:
-                return result[0], result[1], json.dumps(summary)
+        if priority in statuses:
+            with profiler.phase("盤面の組み立て"):
+                status, grid = solver.results[statuses.index(priority)]
+            return finish(status, grid, summary)
     # フォールバック（全件いずれかを返す）
-    return solver.results[-1][0], solver.results[-1][1], json.dumps(summary)
+    return finish(*solver.results[-1], summary)
+
+
+def _solve_region(args):
+    board_grid, pieces, piece_ids, limit_nums, num_reads, kwargs = args
+    return solve(board_grid, pieces, piece_ids, limit_nums, num_reads, **kwargs)
+
+
+def _label_region(grid, i):
+    """成分をまたいで配置の名前が重ならないように、成分の番号を付け足す"""
+    return [[f"{cell}.{i + 1}" if isinstance(cell, str) else cell for cell in row] for row in grid]
+
+
+def solve_regions(board_grid, pieces, piece_ids, limit_nums, num_reads, workers=None, max_allocations=20, **kwargs):
+    """壁で分かれた連結成分ごとに問題を分けて解き、結果を1つの盤面につなぎ合わせる
+
+    成分ごとのピース枚数の割り当てを面積から列挙し、割り当てごとに各成分を（workers があれば並列に）
+    solve() で解く。全成分が成功した割り当てが見つかればそれを返し、集計にはその割り当ての分だけを入れる
+    （試した割り当ての数は "試した割り当て"）。成分が1つしかない、面積の上で埋められる割り当てが無い、
+    または試した割り当てがどれも全成分では成功しなかった場合は、盤面全体をそのまま solve() で解く
+    （割り当ては max_allocations 件までしか試さないので、成分ごとの失敗は盤面全体の解なしを意味しない）。
+    cancel_event がセットされたら残りの割り当ては試さない。
+    """
+    crops, allocations = decompose(board_grid, pieces, limit_nums, max_allocations=max_allocations)
+    if len(crops) <= 1 or not allocations:
+        return solve(board_grid, pieces, piece_ids, limit_nums, num_reads, workers=workers, **kwargs)
+    whole_kwargs = kwargs
+    previous = kwargs.pop("previous", None)
+    if previous is not None and (len(previous), len(previous[0])) != (len(board_grid), len(board_grid[0])):
+        previous = None
+    cancel_event = kwargs.get("cancel_event")
+
+    profiler = Profiler() if kwargs.get("profile") else NULL_PROFILER
+    max_solutions = kwargs.get("max_solutions", 0)
+    if max_solutions:
+        # 成分ごとの対称性で同一視すると全体では別の解までまとめてしまうので、まとめるのはつなぎ合わせた後にする
+        symmetric = kwargs.get("symmetric", True)
+        kwargs = {**kwargs, "symmetric": False}
+    if workers and workers > 1:
+        # イベントや進捗の関数は別のプロセスには渡せない（取り消しは割り当ての切れ目で確かめる）
+        kwargs = {k: v for k, v in kwargs.items() if k not in ("cancel_event", "progress")}
+    best = None
+    attempts = 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+    try:
+        for allocation in allocations:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            attempts += 1
+            tasks = []
+            for (grid, (r0, c0)), counts in zip(crops, allocation):
+                used = [k for k, n in enumerate(counts) if n > 0]
+                region_kwargs = kwargs
+                if previous is not None:
+                    # 前回の結果も成分の範囲だけを切り出して渡す
+                    region_previous = [row[c0:c0 + len(grid[0])] for row in previous[r0:r0 + len(grid)]]
+                    region_kwargs = {**kwargs, "previous": region_previous}
+                tasks.append((grid, [pieces[k] for k in used], [piece_ids[k] for k in used],
+                              [counts[k] for k in used], num_reads, region_kwargs))
+            outcomes = list(pool.map(_solve_region, tasks)) if pool else [_solve_region(t) for t in tasks]
+
+            region_summaries, region_solutions = [], []
+            for _, _, region_summary in outcomes:
+                region_summary = json.loads(region_summary)
+                profile = region_summary.pop("プロファイル", None)
+                if profile is not None:
+                    profiler.merge(profile)
+                region_solutions.append(region_summary.pop("解の一覧", []))
+                region_summary.pop("異なる解", None)
+                region_summaries.append(region_summary)
+            successes = sum(reason == "成功" for reason, _, _ in outcomes)
+            if best is None or successes > best[0]:
+                best = (successes, outcomes, region_summaries, region_solutions)
+            if successes == len(outcomes):
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    cancelled = cancel_event is not None and cancel_event.is_set()
+    if best is None or (best[0] < len(crops) and not cancelled):
+        if cancelled:
+            return "中断", deepcopy(board_grid), json.dumps({"試した割り当て": attempts})
+        # どの割り当てでも全成分は埋まらなかった。割り当ての列挙は打ち切っているので、盤面全体で解き直す
+        reason, grid, whole_summary = solve(board_grid, pieces, piece_ids, limit_nums, num_reads, workers=workers,
+                                            previous=previous, **whole_kwargs)
+        whole_summary = json.loads(whole_summary)
+        whole_summary["試した割り当て"] = attempts
+        if "プロファイル" in whole_summary:
+            profiler.merge(whole_summary["プロファイル"])
+            _set_sample_rate(profiler)
+            whole_summary["プロファイル"] = profiler.to_dict()
+        return reason, grid, json.dumps(whole_summary)
+
+    successes, outcomes, region_summaries, region_solutions = best
+    summary = Counter()
+    for region_summary in region_summaries:
+        summary.update(region_summary)
+    summary["試した割り当て"] = attempts
+    grids = [_label_region(grid or crop, i) for i, ((crop, _), (_, grid, _)) in enumerate(zip(crops, outcomes))]
+    reasons = [reason for reason, _, _ in outcomes]
+    reason = next((r for r in ("解なし", "打ち切り", "使いすぎ", "空きあり", "中断") if r in reasons), "成功")
+    summary["領域数"] = len(crops)
+    if max_solutions and successes == len(outcomes):
+        # 成分ごとの解の組み合わせをつなぎ合わせ、盤面全体の対称性で同一視する
+        cells = grid_cells(board_grid)
+        solutions = SolutionSet(cells, len(board_grid), len(board_grid[0]), max_solutions, symmetric)
+        for combination in itertools.islice(itertools.product(*region_solutions), MAX_COMBINATIONS):
+            grid = stitch(board_grid, crops, [_label_region(s["盤面"], i) for i, s in enumerate(combination)])
+            solutions.add(grid_groups(grid, cells), grid, math.prod(s["回数"] for s in combination))
+        summary["異なる解"] = len(solutions)
+        if solutions.overflow:
+            summary["上限を超えた解"] = solutions.overflow
+        summary["解の一覧"] = [{"盤面": grid, "回数": count} for grid, count in solutions.ranked()]
+    if kwargs.get("profile"):
+        _set_sample_rate(profiler)
+        summary["プロファイル"] = profiler.to_dict()
+    return reason, stitch(board_grid, crops, grids), json.dumps(summary)
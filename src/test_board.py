@@ -0,0 +1,58 @@
+from copy import deepcopy
+
+import numpy as np
+
+from pages.board import Board
+from pages.piece import Piece
+
+
+def _can_place_by_list(grid, piece_shape, r_start, c_start):
+    """リストを1マスずつ見て配置できるかを判定する（ビット演算の検証用）"""
+    for pr, row in enumerate(piece_shape):
+        for pc, v in enumerate(row):
+            if v == 1:
+                br, bc = r_start + pr, c_start + pc
+                if not (0 <= br < len(grid) and 0 <= bc < len(grid[0])):
+                    return False
+                if grid[br][bc] is None or grid[br][bc] != 0:
+                    return False
+    return True
+
+
+def _random_grid(rng, rows, cols):
+    return [[None if rng.random() < 0.2 else 0 for _ in range(cols)] for _ in range(rows)]
+
+
+def test_can_place_matches_list_scan():
+    rng = np.random.default_rng(0)
+    shapes = [v for g in ([[1, 1, 1], [1, 0, 0]], [[0, 1, 0], [1, 1, 1]], [[1]]) for v in Piece(g).variations]
+    for _ in range(20):
+        grid = _random_grid(rng, 6, 7)
+        board = Board(deepcopy(grid))
+        for shape in shapes:
+            expected = [(r, c) for r in range(6) for c in range(7) if _can_place_by_list(grid, shape, r, c)]
+            assert board.scan_position_to_place(shape) == expected
+            for r in range(-2, 8):
+                for c in range(-2, 9):
+                    assert board.can_place(shape, r, c) == _can_place_by_list(grid, shape, r, c)
+
+
+def test_fill_keeps_grid_and_bits_in_sync():
+    class Placed:
+        piece_shape = [[1, 1], [0, 1]]
+        name = "1-1"
+
+    board = Board([[0, 0, 0], [0, None, 0], [0, 0, 0]])
+    assert board.num_empty() == 8 and not board.is_full()
+    assert board.can_place(Placed.piece_shape, 0, 1)
+
+    board.fill(Placed, 0, 1)
+    assert board.grid[0][1:] == ["1-1", "1-1"] and board.grid[1][2] == "1-1"
+    assert not board.can_place(Placed.piece_shape, 0, 1)
+    assert board.overlaps(board.placement_mask([[1]], 1, 2))
+    assert not board.overlaps(board.placement_mask([[1]], 2, 2))
+    assert Board(deepcopy(board.grid)).occupied == board.occupied
+    assert board.num_empty() == 5
+
+    board.wipe_out()
+    assert board.num_empty() == 8 and board.grid[1][1] is None
@@ -0,0 +1,51 @@
+import io
+import json
+
+from cli import main, run
+
+INSTANCES = [
+    {"id": "3x3", "board": [[0, 0, 0], [0, 0, 0], [0, 0, 0]], "pieces": [[[1, 1], [0, 1]], [[1, 1, 1]]],
+     "limits": [2, 1], "options": {"engine": "exact"}},
+    {"board": [[0, 0], [0, None]], "pieces": [[[1, 1]]], "limits": [1], "options": {"engine": "exact"}},
+    {"id": "bad", "board": [[0]], "pieces": [[[1]]]},
+]
+
+
+def _lines():
+    return [json.dumps(instance) for instance in INSTANCES]
+
+
+def test_run_streams_one_line_per_instance():
+    for workers in (1, 2):
+        out = io.StringIO()
+        assert run(iter(_lines()), out, workers=workers, max_in_flight=1) == 3
+        results = {r["id"]: r for r in map(json.loads, out.getvalue().splitlines())}
+        assert set(results) == {"3x3", 2, "bad"}
+        assert results["3x3"]["status"] == "成功" and results["3x3"]["summary"]["成功"] == 1
+        assert results[2]["status"] == "解なし"
+        assert results["bad"]["status"] == "エラー" and "limits" in results["bad"]["error"]
+        assert all(r["seconds"] >= 0 for r in results.values())
+
+
+def test_resume_skips_finished_and_drops_partial_line(tmp_path):
+    source = tmp_path / "in.jsonl"
+    source.write_text("\n".join(_lines()) + "\n", encoding="utf-8")
+    output = tmp_path / "out.jsonl"
+    output.write_text(json.dumps({"id": "3x3", "status": "成功"}) + "\n" + '{"id": 2, "sta', encoding="utf-8")
+
+    main([str(source), "-o", str(output), "--resume", "--workers", "1"])
+    results = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [r["id"] for r in results] == ["3x3", 2, "bad"]
+    assert "grid" not in results[0]
+
+
+def test_malformed_line_is_reported_and_the_rest_still_runs():
+    broken = ['{"id": "broken", "board": [[0', "[1, 2]"]
+    lines = [json.dumps(INSTANCES[0]), *broken, json.dumps({**INSTANCES[1], "id": "c"})]
+    for workers in (1, 2):
+        out = io.StringIO()
+        assert run(iter(lines), out, workers=workers) == 4
+        results = {r["id"]: r for r in map(json.loads, out.getvalue().splitlines())}
+        assert results["3x3"]["status"] == "成功" and results["c"]["status"] == "解なし"
+        assert results[2]["status"] == "エラー" and "JSONDecodeError" in results[2]["error"]
+        assert results[3]["status"] == "エラー" and "ValueError" in results[3]["error"]
@@ -0,0 +1,43 @@
+import json
+
+from pages.codec import decode_board, decode_result, encode_board, encode_result, piece_color, piece_key, piece_shape
+from pages.piece import Piece
+from pages.result_cache import ResultCache
+
+
+def test_board_round_trips_through_a_mask():
+    grid = [[0] * 20 for _ in range(20)]
+    grid[0][0] = grid[7][13] = grid[19][19] = None
+    encoded = encode_board(grid)
+    assert decode_board(encoded) == grid
+    assert len(json.dumps(encoded)) * 5 < len(json.dumps(grid))
+
+
+def test_piece_key_is_the_same_for_every_rotation():
+    shapes = Piece([[1, 1, 1], [1, 0, 0]]).variations
+    keys = {piece_key(shape) for shape in shapes}
+    assert len(keys) == 1
+    key = keys.pop()
+    assert piece_shape(key) in shapes
+    assert piece_color(key) == Piece(shapes[0]).dump()[1]
+    assert piece_key([["0", "1"], ["1", "1"]]) != key
+
+
+def test_result_round_trips_as_placements():
+    grid = [["1-1", "1-1", None], ["2-3.2", 0, "1-4"], ["2-3.2", "2-3.2", "1-4"]]
+    encoded = encode_result(grid)
+    assert len(encoded["placements"]) == 3
+    assert decode_result(encoded) == grid
+
+
+def test_result_cache_keys_by_content_and_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path / "results.sqlite", max_entries=2)
+    first = cache.put({"結果": None, "集計": "{}"})
+    assert cache.put({"結果": None, "集計": "{}"}) == first and len(cache) == 1
+    assert cache.get(first) == {"結果": None, "集計": "{}"}
+    second = cache.put({"結果": 1})
+    assert cache.get(first) is not None
+    cache.put({"結果": 2})
+    assert len(cache) == 2
+    assert cache.get(second) is None and cache.get(first) is not None
+    assert cache.get(None) is None
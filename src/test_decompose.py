@@ -0,0 +1,56 @@
+import json
+import threading
+
+from pages.decompose import allocate_limits, connected_regions, crop_region
+from pages.solver import solve_regions
+
+
+def test_connected_regions_and_crop():
+    board_grid = [[0, 0, None, 0], [None, None, None, 0], [0, None, 0, 0]]
+    regions = connected_regions(board_grid)
+    assert regions == [[(0, 0), (0, 1)], [(0, 3), (1, 3), (2, 2), (2, 3)], [(2, 0)]]
+    assert crop_region(regions[1]) == ([[None, 0], [None, 0], [0, 0]], (0, 2))
+
+
+def test_allocate_limits_matches_areas():
+    # 面積 4 と 2 の成分に、1x2（上限 3）と L 字 3 マス（上限 1）と 1x1（上限 1）を割り当てる
+    fits = [[True, True, True], [True, False, True]]
+    allocations = allocate_limits([4, 2], [2, 3, 1], [3, 1, 1], fits)
+    for allocation in allocations:
+        assert [sum(n * s for n, s in zip(counts, [2, 3, 1])) for counts in allocation] == [4, 2]
+        assert all(sum(counts[k] for counts in allocation) <= [3, 1, 1][k] for k in range(3))
+        assert allocation[1][1] == 0
+    assert [[2, 0, 0], [1, 0, 0]] in allocations and [[0, 1, 1], [1, 0, 0]] in allocations
+    assert allocate_limits([5], [2], [2], [[True]]) == []
+
+
+def test_solve_regions_stitches_region_results():
+    board_grid = [[0, 0, 0, None, 0], [0, 0, 0, None, 0], [0, 0, 0, None, 0]]
+    pieces = [[[1, 1], [0, 1]], [[1, 1, 1]]]
+    reason, grid, _ = solve_regions(board_grid, pieces, [1, 2], [2, 2], 50, seed=0)
+    assert reason == "成功"
+    assert all(grid[r][3] is None for r in range(3))
+    assert {grid[r][4] for r in range(3)} == {grid[0][4]} and grid[0][4].startswith("2-")
+    assert all(grid[r][c] not in (0, None) for r in range(3) for c in range(3))
+
+
+def test_solve_regions_does_not_trust_failed_allocations():
+    # T 字の成分は 1x2 では埋まらないが、面積だけを見た最初の割り当ては 1x2 を2枚ずつ配る
+    board_grid = [[0, 0, 0, None, 0, 0], [None, 0, None, None, 0, 0]]
+    pieces = [[[1, 1]], [[1, 1, 1], [0, 1, 0]]]
+    reason, grid, summary = solve_regions(board_grid, pieces, [1, 2], [4, 1], 0, max_allocations=1, engine="exact")
+    assert reason == "成功"
+    assert json.loads(summary)["試した割り当て"] == 1
+    assert all(v not in (0, None) for row in grid for v in row if v is not None)
+
+    # 集計には成功した割り当ての分だけが入る
+    reason, _, summary = solve_regions(board_grid, pieces, [1, 2], [4, 1], 0, max_allocations=5, engine="exact")
+    summary = json.loads(summary)
+    assert reason == "成功"
+    assert summary["成功"] == summary["領域数"] == 2 and "解なし" not in summary
+    assert summary["試した割り当て"] == 2
+
+    cancel_event = threading.Event()
+    cancel_event.set()
+    reason, grid, _ = solve_regions(board_grid, pieces, [1, 2], [4, 1], 0, engine="exact", cancel_event=cancel_event)
+    assert reason == "中断" and grid == board_grid
@@ -0,0 +1,49 @@
+from dash import dcc, html
+from pages.codec import encode_board
+from pages.figures import (
+    EMPTY_COLOR, WALL_COLOR, board_figure, cached_board_figure, piece_figure, render_board, result_figure, toggle_cell_js
+)
+
+
+def _cell_colors(figure):
+    """図の各セルに塗られる色を、カラースケールから引いて二次元リストで返す"""
+    heatmap = figure.data[0]
+    scale = [color for _, color in heatmap.colorscale[::2]]
+    return [[scale[z] for z in row] for row in heatmap.z]
+
+
+def test_board_is_one_heatmap_whatever_the_size():
+    board = [[0] * 20 for _ in range(20)]
+    board[3][4] = None
+    figure = board_figure(board)
+    assert len(figure.data) == 1
+    colors = _cell_colors(figure)
+    assert colors[3][4] == WALL_COLOR
+    assert sum(row.count(EMPTY_COLOR) for row in colors) == 399
+    assert (figure.layout.width, figure.layout.height) == (800, 800)
+
+    assert _cell_colors(piece_figure([[1, 0], [1, 1]], "#123456")) == [["#123456", EMPTY_COLOR], ["#123456"] * 2]
+
+
+def test_result_colors_placements_by_piece_and_labels_them():
+    board = [["1-1", "1-1", None], ["2-3.2", 0, "1-4"]]
+    figure = result_figure(board, {1: "#ff0000", 2: "#00ff00"})
+    assert _cell_colors(figure) == [["#ff0000", "#ff0000", WALL_COLOR], ["#00ff00", EMPTY_COLOR, "#ff0000"]]
+    assert [list(row) for row in figure.data[0].text] == [["1-1", "1-1", ""], ["2-3.2", "", "1-4"]]
+
+
+def test_toggle_script_switches_between_the_given_values():
+    script = toggle_cell_js(0, None)
+    assert "=== null ? 0 : null" in script
+    assert "clickData.points[0]" in script
+
+
+def test_board_figures_are_cached_by_content():
+    first = render_board(encode_board([[0, None], [0, 0]]))
+    assert isinstance(first, dcc.Graph)
+    assert render_board(encode_board([[0, None], [0, 0]])).figure is first.figure
+    assert render_board(encode_board([[0, 0], [0, 0]])).figure is not first.figure
+    assert cached_board_figure.cache_info().hits >= 1
+
+    assert isinstance(render_board(None), html.P)
+    assert render_board("[[0, 0]]").children == "無効なボードデータ形式です。"
@@ -0,0 +1,50 @@
+import threading
+import time
+
+import pytest
+
+from pages.jobs import JobManager, JobRejected
+from pages.solver import solve
+
+
+def _wait(jobs, job_id):
+    while jobs.get(job_id).status not in JobManager.FINISHED:
+        time.sleep(0.01)
+    return jobs.get(job_id)
+
+
+def test_job_runs_solver_in_background():
+    jobs = JobManager(max_workers=1, max_queued=0)
+    job_id = jobs.submit(solve, [[0, 0, 0], [0, 0, 0], [0, 0, 0]], [[[1, 1], [0, 1]], [[1, 1, 1]]], [1, 2], [2, 1], 50,
+                         meta={"piece_nums": [2, 1]})
+    job = _wait(jobs, job_id)
+    assert job.status == "完了" and job.result[0] == "成功"
+    assert job.meta == {"piece_nums": [2, 1]}
+    assert job.progress["counts"]["成功"] == 1 and job.progress["reads_done"] <= 50
+
+
+def test_full_pool_rejects_and_cancel_stops_job():
+    release = threading.Event()
+
+    def blocking(cancel_event, progress):
+        while not (release.is_set() or cancel_event.is_set()):
+            time.sleep(0.01)
+        return "done"
+
+    jobs = JobManager(max_workers=1, max_queued=1)
+    running = jobs.submit(blocking)
+    queued = jobs.submit(blocking)
+    with pytest.raises(JobRejected):
+        jobs.submit(blocking)
+
+    jobs.cancel(queued)
+    jobs.cancel(running)
+    assert _wait(jobs, running).status == "取消"
+    assert _wait(jobs, queued).status == "取消"
+
+
+def test_solve_cancelled_before_first_read():
+    cancel_event = threading.Event()
+    cancel_event.set()
+    reason, grid, _ = solve([[0, 0], [0, 0]], [[[1, 1]]], [1], [2], 10, cancel_event=cancel_event)
+    assert reason == "中断" and grid is None
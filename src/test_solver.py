@@ -1,5 +1,43 @@
-from pages.solver import Solver
+from benchmark import INSTANCES, generate_instance
+from collections import Counter
+from copy import deepcopy
+from pages.autotune import TuningStore, autotune, instance_key
+from pages.exact import ExactSearch
+from pages.model_cache import ModelCache
+from pages.profiling import NULL_PROFILER, Profiler
+from pages.repair import repair
+from pages.solver import Solver, build_solver, solve, solve_regions
+import json
 import numpy as np
+import pyqubo
+import pytest
+import threading
+
+
+def _pyqubo_objective(solver, coef_use, coef_fill):
+    """pyqubo の式として目的関数を組み立てる（Solver.build_bqm の検証用）"""
+    conditions_use = []
+    for variable_list, limit in zip(solver.variables.values(), solver.limits):
+        conditions_use.append((sum([pyqubo.Binary(v.name) for v in variable_list])-limit)**2)
+
+    conditions_fill = []
+    for cell in solver.cell_index:
+        conditions_fill.append(
+            (sum([pyqubo.Binary(v.name) for variables in solver.variables.values() for v in variables if cell in v.cells])-1)**2
+        )
+    return coef_use*sum(conditions_use) + coef_fill*sum(conditions_fill)
+
+def _assert_tiling(grid, board_grid, limits):
+    """盤面の配置可能セルがすべて配置で埋まり、ピースの使用数が上限以内であることを確かめる"""
+    names = set()
+    for row, board_row in zip(grid, board_grid):
+        for cell, board_cell in zip(row, board_row):
+            assert (cell is None) == (board_cell is None)
+            if cell is not None:
+                assert isinstance(cell, str)
+                names.add(cell)
+    used = Counter(int(name.split("-")[0]) for name in names)
+    assert all(used[piece_id] <= limit for piece_id, limit in enumerate(limits, start=1))
 
 def test_3x3():
     board_grid = [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
@@ -8,12 +46,11 @@ def test_3x3():
     limits = [2, 1]
 
     solver = Solver(board_grid, pieces, piece_ids, limits)
-    solver.run(10)
+    solver.run(10, seed=0)
 
-    for r in solver.results:
-        if r[0] == "成功":
-            print(r)
-            break
+    assert "成功" in solver.results.statuses
+    status, grid = solver.results[solver.results.statuses.index("成功")]
+    _assert_tiling(grid, board_grid, limits)
 
 def test_4x4():
     board_grid = [[0, 0, 0, 0], [0, None, None, 0], [0, None, 0, 0], [0, 0, 0, 0]]
@@ -22,36 +59,417 @@ def test_4x4():
     limits = [2, 1, 1, 1]
 
     solver = Solver(board_grid, pieces, piece_ids, limits)
-    solver.run(5)
+    solver.run(5, seed=0)
 
-    for r in solver.results:
-        if r[0] == "成功":
-            print(r)
-            break
+    assert "成功" in solver.results.statuses
+    status, grid = solver.results[solver.results.statuses.index("成功")]
+    _assert_tiling(grid, board_grid, limits)
 
 def test_10x10():
-    board_grid = [
-        [None,None,None,0,0,0,0,None,None,None],[0,0,0,0,0,0,0,0,0,0],
-        [None,None,None,0,0,0,0,None,None,None],[0,0,0,0,0,0,0,0,0,0],
-        [0,0,0,0,0,0,0,0,0,0],[0,0,0,0,0,0,0,0,0,0],[0,0,0,0,0,0,0,0,0,0],
-        [None,0,0,0,0,0,0,0,0,None],[None,0,0,0,0,0,0,0,0,None],[None,0,0,0,0,0,0,0,0,None]]
-    pieces = [
-        [[1]], [[1,1]], [[1,1,1]], [[1,1],[0,1]], 
-        [[1,1,1],[1,0,0]], [[1,1,1],[0,1,1]], [[0,1,1],[1,1,1]], [[1,0,0],[1,0,0],[1,1,1]],
-        [[1,1,1],[1,0,1],[1,0,1]], [[1,1,1],[1,1,0],[1,1,0]], [[1,1,1],[1,1,1],[1,0,0],[1,1,1]],
-        [[1,1,1,1],[0,0,1,1,],[0,0,0,1]], [[1,1,1,1],[1,1,1,1],[0,0,0,1],[0,0,0,1]], 
-        [[1,1,1,1,1],[1,0,0,0,0],[1,0,0,0,0]]
-    ]
-    piece_ids = [1,2,3,4,5,6,7,8,9,10,11,12,13,14]
-    limits = [1, 1, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
+    board_grid, pieces, limits = INSTANCES["10x10"]
+    piece_ids = list(range(1, len(pieces) + 1))
+
+    # 焼きなましでは成功までに数千回の読み出しが要るので、厳密探索で解けることと解の正しさを確かめる
+    reason, grid, summary = solve(board_grid, pieces, piece_ids, limits, 0, engine="exact")
+    assert reason == "成功"
+    _assert_tiling(grid, board_grid, limits)
+
+    # 焼きなましは短く回し、評価と盤面の組み立てが矛盾しないことだけを確かめる
+    solver = Solver(board_grid, pieces, piece_ids, limits, presolve=True)
+    solver.run(4, early_stop=False, seed=0, sampler="exact_cover", sampler_options={"num_sweeps": 20})
+    assert len(solver.results) == 4
+    assert set(solver.results.statuses) <= {"成功", "空きあり", "使いすぎ"}
+
+def test_generated_instances_are_solvable_and_reproducible():
+    for seed in range(3):
+        board_grid, pieces, limits = generate_instance(seed, 6, 6, wall_density=0.2)
+        assert generate_instance(seed, 6, 6, wall_density=0.2) == (board_grid, pieces, limits)
+        reason, grid, _ = solve(board_grid, pieces, list(range(1, len(pieces) + 1)), limits, 0, engine="exact")
+        assert reason == "成功"
+        _assert_tiling(grid, board_grid, limits)
+
+def test_build_bqm_matches_pyqubo():
+    board_grid = [[0, 0, 0, 0], [0, None, None, 0], [0, None, 0, 0], [0, 0, 0, 0]]
+    pieces = [[[1, 1]], [[1, 1, 1, 1], [0, 1, 0, 0]], [[1, 1, 1], [0, 0, 1]], [[1, 1, 1], [0, 0, 1], [0, 0, 1]]]
+    piece_ids = [1, 2, 3, 4]
+    limits = [2, 1, 1, 1]
 
     solver = Solver(board_grid, pieces, piece_ids, limits)
-    solver.run(1000)
+    expected = _pyqubo_objective(solver, coef_use=7, coef_fill=13).compile().to_bqm()
+    actual = solver.build_bqm(coef_use=7, coef_fill=13)
+    assert set(actual.variables) == set(expected.variables)
+
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        sample = {v: int(rng.integers(2)) for v in actual.variables}
+        assert np.isclose(actual.energy(sample), expected.energy(sample))
+
+
+def test_model_cache_reuses_models_and_recombines_coefficients():
+    board_grid = [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
+    pieces = [[[1, 1], [0, 1]], [[1, 1, 1]]]
+    cache = ModelCache()
+
+    first = build_solver(board_grid, pieces, [1, 2], [2, 1], cache=cache)
+    second = build_solver(board_grid, pieces, [1, 2], [2, 1], cache=cache)
+    assert second.parts is first.parts
+    build_solver(board_grid, pieces, [1, 2], [1, 1], cache=cache)
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+    fresh = Solver(board_grid, pieces, [1, 2], [2, 1], presolve=True)
+    assert second.build_bqm(coef_use=3, coef_fill=5) == fresh.build_bqm(coef_use=3, coef_fill=5)
+
+    small = ModelCache(max_bytes=first.nbytes)
+    build_solver(board_grid, pieces, [1, 2], [2, 1], cache=small)
+    build_solver(board_grid, pieces, [1, 2], [1, 1], cache=small)
+    assert small.stats()["entries"] == 1 and small.stats()["evictions"] == 1
+
+
+@pytest.mark.parametrize("presolve", [False, True])
+def test_incremental_rebuild_matches_build_from_scratch(presolve):
+    board_grid = [[0] * 6 for _ in range(6)]
+    board_grid[2][2] = None
+    pieces = [[[1, 1, 1], [1, 0, 0]], [[1, 1], [1, 1]], [[1, 1, 1, 1]], [[0, 1, 0], [1, 1, 1]]]
+    piece_ids, limits = [1, 2, 3, 4], [3, 2, 2, 3]
+    base = Solver(board_grid, pieces, piece_ids, limits, presolve=presolve)
+    base.qubo_parts()
+
+    walled = deepcopy(board_grid)
+    walled[0][0] = None
+    opened = deepcopy(board_grid)
+    opened[2][2] = 0
+    edits = [
+        (walled, pieces, piece_ids, limits),
+        (opened, pieces, piece_ids, limits),
+        (board_grid, pieces + [[[1, 1]]], piece_ids + [5], limits + [2]),
+        (board_grid, pieces[1:], piece_ids[1:], limits[1:]),
+        (board_grid, pieces, piece_ids, [3, 2, 1, 3]),
+    ]
+    for edit in edits:
+        profiler = Profiler()
+        incremental = Solver(*edit, presolve=presolve, profiler=profiler, base=base)
+        scratch = Solver(*edit, presolve=presolve)
+        assert profiler.counters["再利用した配置候補"] > 0
+        assert incremental.placement_names == scratch.placement_names
+        assert [v.cells for v in incremental.placements] == [v.cells for v in scratch.placements]
+        assert incremental.model_labels == scratch.model_labels
+        assert incremental.build_bqm(coef_use=3, coef_fill=5) == scratch.build_bqm(coef_use=3, coef_fill=5)
+
+    # キャッシュに無い問題は、最後に使ったモデルから組み立て直す
+    cache = ModelCache()
+    build_solver(board_grid, pieces, piece_ids, limits, cache=cache, presolve=presolve)
+    profiler = Profiler()
+    rebuilt = build_solver(walled, pieces, piece_ids, limits, cache=cache, presolve=presolve, profiler=profiler)
+    assert profiler.counters["再利用した配置候補"] > 0
+    assert rebuilt.build_bqm() == Solver(walled, pieces, piece_ids, limits, presolve=presolve).build_bqm()
+
+
+def test_presolve_fixes_forced_and_dead_placements():
+    # 左下のマスは縦のドミノでしか埋まらず、それを置くと残りの2マスも横のドミノで決まる
+    solver = Solver([[0, 0, 0], [0, None, None]], [[[1, 1]]], [1], [2], presolve=True)
+    assert len(solver.presolved.forced) == 2 and len(solver.model_placements) == 0
+    solver.run(5, seed=0)
+    assert solver.results[-1][0] == "成功"
+
+    # 1 列目だけを残してドミノを置くと、1 マスの穴は埋められない
+    board_grid = [[0, 0, 0, 0, 0]]
+    solver = Solver(board_grid, [[[1, 1]], [[1, 1, 1]]], [1, 2], [1, 1], presolve=True)
+    assert any(
+        solver.placement_pieces[p] == 0 and solver.placements[p].position == (0, 1) for p in solver.presolved.removed
+    )
+    assert solver.build_bqm().num_variables == len(solver.model_placements) < len(solver.placements)
+    solver.run(20, seed=0)
+    assert solver.results[-1][0] == "成功"
+
+    # L 字 3 マスしかないと 2x2 は埋まらない
+    solver = Solver([[0, 0], [0, 0]], [[[1, 1], [0, 1]]], [1], [2], presolve=True)
+    assert solver.presolved.infeasible
+
+    # 枚数 0 のピースは固定されず、置く場所がなくなれば解なしになる
+    board_grid = [[None, 0, 0], [None, 0, 0], [0, 0, 0]]
+    pieces = [[[1, 1, 1]], [[1, 1], [1, 1]], [[1, 1, 1], [0, 1, 0]]]
+    solver = Solver(board_grid, pieces, [1, 2, 3], [3, 0, 4], presolve=True)
+    assert not any(solver.placement_pieces[p] == 1 for p in solver.presolved.forced)
+    assert min(solver.model_limits) >= 0
+    for engine in ("anneal", "exact"):
+        reason, _, summary = solve(board_grid, pieces, [1, 2, 3], [3, 0, 4], 20, seed=0, engine=engine)
+        assert reason == "解なし" and json.loads(summary)["解なし"] == 1
+
+
+def test_early_stop_skips_remaining_batches():
+    board_grid = [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
+    pieces = [[[1, 1], [0, 1]], [[1, 1, 1]]]
+
+    solver = Solver(board_grid, pieces, [1, 2], [2, 1])
+    solver.run(100, batch_size=5, seed=1)
+    assert solver.results[-1][0] == "成功"
+    assert solver.reads_done < 100
+
+    reports = []
+    solver.run(20, early_stop=False, batch_size=5, seed=1, progress=reports.append)
+    assert solver.reads_done == solver.results.total == 20
+    assert [r["reads_done"] for r in reports] == [5, 10, 15, 20]
+    assert sum(reports[-1]["counts"].values()) == 20
+
+
+def test_results_keep_unique_placement_indices_with_counts():
+    board_grid = [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
+    solver = Solver(board_grid, [[[1, 1], [0, 1]], [[1, 1, 1]]], [1, 2], [2, 1])
+    solver.run(30, early_stop=False, seed=2)
+    results = solver.results
+    assert results.total == 30 and len(results) < 30
+    assert results.status_counts() == Counter(
+        {status: n for status, n in zip(*np.unique(np.repeat(results.statuses, results.counts), return_counts=True))}
+    )
+    for i in range(len(results)):
+        assert results.placements[i].dtype == np.int32
+        assert np.array_equal(np.flatnonzero(results.sample(i)), results.placements[i])
+
+    # 同じサンプルを足すと件数だけが増える
+    before = len(results), results.counts[0]
+    results.extend([results.statuses[0]], [results.sample(0)])
+    assert (len(results), results.counts[0]) == (before[0], before[1] + 1)
+
+
+def test_parallel_run_reproduces_serial_run():
+    board_grid = [[0, 0, 0, 0], [0, None, None, 0], [0, None, 0, 0], [0, 0, 0, 0]]
+    pieces = [[[1, 1]], [[1, 1, 1, 1], [0, 1, 0, 0]], [[1, 1, 1], [0, 0, 1]], [[1, 1, 1], [0, 0, 1], [0, 0, 1]]]
+    solver = Solver(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1])
+
+    solver.run(12, early_stop=False, batch_size=3, seed=7)
+    serial = list(solver.results)
+    solver.run(12, early_stop=False, batch_size=3, seed=7, workers=2)
+    assert list(solver.results) == serial
+
+
+def test_evaluate_matches_per_sample_check():
+    board_grid = [[0, 0, 0, 0], [0, None, None, 0], [0, None, 0, 0], [0, 0, 0, 0]]
+    pieces = [[[1, 1]], [[1, 1, 1, 1], [0, 1, 0, 0]], [[1, 1, 1], [0, 0, 1]], [[1, 1, 1], [0, 0, 1], [0, 0, 1]]]
+    limits = [2, 1, 1, 1]
+    solver = Solver(board_grid, pieces, [1, 2, 3, 4], limits)
+
+    rng = np.random.default_rng(0)
+    samples = (rng.random((200, len(solver.placements))) < 0.03).astype(np.int8)
+    for sample, status in zip(samples, solver.evaluate(samples)):
+        active = np.flatnonzero(sample)
+        used = np.bincount(solver.placement_pieces[active], minlength=len(limits))
+        if np.any(used > limits):
+            assert status == "使いすぎ"
+        elif np.all(solver.incidence.coverage(active) == 1):
+            assert status == "成功"
+        else:
+            assert status == "空きあり"
+
+
+def test_exact_cover_annealer_energies_match_bqm():
+    board_grid = [[0, 0, 0, 0], [0, None, None, 0], [0, None, 0, 0], [0, 0, 0, 0]]
+    pieces = [[[1, 1]], [[1, 1, 1, 1], [0, 1, 0, 0]], [[1, 1, 1], [0, 0, 1]], [[1, 1, 1], [0, 0, 1], [0, 0, 1]]]
+    solver = Solver(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1])
+
+    annealer = solver.make_sampler("exact_cover", coef_use=7, coef_fill=13, num_sweeps=20)
+    sampleset = annealer.sample(30, seed=0)
+    bqm = solver.build_bqm(coef_use=7, coef_fill=13)
+    assert np.allclose(sampleset.record.energy, bqm.energies(sampleset))
+
+    solver.run(200, sampler="exact_cover", seed=0)
+    assert solver.results[-1][0] == "成功"
+
+
+def test_exact_search_finds_tiling_or_proves_none():
+    board_grid = [[0, 0, 0, 0], [0, None, None, 0], [0, None, 0, 0], [0, 0, 0, 0]]
+    pieces = [[[1, 1]], [[1, 1, 1, 1], [0, 1, 0, 0]], [[1, 1, 1], [0, 0, 1]], [[1, 1, 1], [0, 0, 1], [0, 0, 1]]]
+    reason, grid, summary = solve(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1], 0, engine="exact")
+    assert reason == "成功"
+    assert all(cell not in (0, "") for row in grid for cell in row if cell is not None)
+    used = {cell for row in grid for cell in row if cell is not None}
+    assert sum(1 for name in used if name.startswith("1-")) <= 2
+
+    # 使用上限を守ると面積が足りない
+    reason, _, _ = solve(board_grid, pieces, [1, 2, 3, 4], [1, 1, 1, 1], 0, engine="exact")
+    assert reason == "解なし"
+
+    reason, _, _ = solve(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1], 0, engine="exact",
+                         exact_options={"max_nodes": 0})
+    assert reason == "打ち切り"
+    reason, _, _ = solve(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1], 0, engine="auto")
+    assert reason == "成功"
+
+    # 取り消されたら予算が残っていても探索をやめ、焼きなましにも切り替えない
+    cancel_event = threading.Event()
+    cancel_event.set()
+    for options in ({"engine": "exact"}, {"engine": "auto"}, {"engine": "exact", "max_solutions": 5}):
+        reason, _, _ = solve(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1], 10, cancel_event=cancel_event, **options)
+        assert reason == "中断"
+
+
+def test_repair_turns_near_miss_into_tiling():
+    board_grid = [[0, 0, 0, 0], [0, None, None, 0], [0, None, 0, 0], [0, 0, 0, 0]]
+    pieces = [[[1, 1]], [[1, 1, 1, 1], [0, 1, 0, 0]], [[1, 1, 1], [0, 0, 1]], [[1, 1, 1], [0, 0, 1], [0, 0, 1]]]
+    solver = Solver(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1])
+    status, solution = ExactSearch(solver.incidence, solver.placement_pieces, solver.limits).search()
+    assert status == "成功"
+
+    # 解から1枚抜いて、重なる別の配置候補を1枚足した惜しいサンプル
+    near_miss = np.zeros(len(solver.placements), dtype=np.int8)
+    near_miss[solution[1:]] = 1
+    overlapping = next(
+        q for j in solver.incidence.cells_of(solution[1]) for q in solver.incidence.placements_of(j)
+        if q not in solution
+    )
+    near_miss[overlapping] = 1
+    assert solver.evaluate(near_miss[None, :]) != ["成功"]
+
+    repaired = repair(near_miss, solver.incidence, solver.placement_pieces, solver.limits)
+    assert repaired is not None
+    assert solver.evaluate(repaired[None, :]) == ["成功"]
+
+    # 成功しなかった読み出しを修復し、集計に残す
+    reason, _, summary = solve(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1], 4, seed=1, presolve=False,
+                               sampler="exact_cover", sampler_options={"num_sweeps": 1})
+    assert reason == "成功"
+    assert json.loads(summary).get("修復で成功", 0) >= 1
+
+
+def test_autotune_narrows_candidates_and_reuses_saved_params(tmp_path):
+    board_grid = [[0, 0, 0, 0], [0, None, None, 0], [0, None, 0, 0], [0, 0, 0, 0]]
+    pieces = [[[1, 1]], [[1, 1, 1, 1], [0, 1, 0, 0]], [[1, 1, 1], [0, 0, 1]], [[1, 1, 1], [0, 0, 1], [0, 0, 1]]]
+    solver = Solver(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1])
+    candidates = [
+        {"coef_use": 10, "coef_fill": 20, "num_sweeps": 100, "final_accept": 0.01},
+        {"coef_use": 10, "coef_fill": 20, "num_sweeps": 1, "final_accept": 0.01},
+    ]
+    store = TuningStore(tmp_path / "tuned.json")
+    tuning = autotune(solver, 100, sampler="exact_cover", store=store, seed=3, candidates=candidates, min_reads=8)
+    assert tuning.source == "試行"
+    assert tuning.reads == 16
+    assert tuning.params["num_sweeps"] == 100
+    assert store.get(instance_key(solver, "exact_cover")) == tuning.params
+
+    saved = autotune(solver, 100, sampler="exact_cover", store=store, candidates=candidates)
+    assert saved.source == "保存済み" and saved.reads == 0
+    assert saved.params == tuning.params
+
+    reason, _, summary = solve(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1], 20, seed=1, presolve=False,
+                               sampler="exact_cover", tune=True, tuning_store=store)
+    assert reason == "成功"
+    assert json.loads(summary)["num_sweeps (自動調整)"] == 100
+
+    # 1巡（16 候補 × 2 回）にも足りない予算では、試していない候補を選ばず呼び出し側の係数で解く
+    assert autotune(solver, 31, sampler="exact_cover").source == "未実施"
+    tuned = solve(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1], 100, seed=2, tune=True, tuning_store=None,
+                  coef_use=3, coef_fill=40, early_stop=False)
+    plain = solve(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1], 100, seed=2, coef_use=3, coef_fill=40,
+                  early_stop=False)
+    tuned_summary = json.loads(tuned[2])
+    assert tuned_summary.pop("自動調整を行わなかった") == 1
+    assert "coef_use (自動調整)" not in tuned_summary
+    assert tuned_summary == json.loads(plain[2])
+
+
+def test_profile_reports_phases_and_counters():
+    board_grid = [[0, 0, 0, 0], [0, None, None, 0], [0, None, 0, 0], [0, 0, 0, 0]]
+    pieces = [[[1, 1]], [[1, 1, 1, 1], [0, 1, 0, 0]], [[1, 1, 1], [0, 0, 1]], [[1, 1, 1], [0, 0, 1], [0, 0, 1]]]
+    cache = ModelCache()
+    profiler = Profiler()
+    solver = build_solver(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1], cache=cache, profiler=profiler)
+    solver.run(6, early_stop=False, seed=0)
+    assert {"配置候補の走査", "接続関係の構築", "前処理", "制約の構築", "BQM の組み立て", "アニーリング", "評価"} <= set(profiler.timings)
+    assert profiler.counters["評価したサンプル"] == 6
+    assert profiler.counters["二次の項"] == solver.build_bqm().num_interactions
+
+    # キャッシュに残ったモデルは後の計測に書き込まない
+    again = Profiler()
+    build_solver(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1], cache=cache, profiler=again)
+    assert again.counters == {"モデルキャッシュのヒット": 1} and not again.timings
+    assert NULL_PROFILER.to_dict() == {"時間": {}, "カウンタ": {}}
+
+    _, _, summary = solve(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1], 10, seed=0, profile=True)
+    profile = json.loads(summary)["プロファイル"]
+    assert profile["時間"]["全体"] >= profile["時間"]["アニーリング"]
+    assert profile["カウンタ"]["サンプル/秒"] > 0
+    _, _, summary = solve(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1], 10, seed=0)
+    assert "プロファイル" not in json.loads(summary)
+
+
+def test_solutions_are_unique_modulo_symmetry_and_same_shape_swaps():
+    board_grid = [[0] * 4 for _ in range(4)]
+    _, grid, summary = solve(board_grid, [[[1, 1]]], [1], [8], 0, engine="exact", max_solutions=100)
+    summary = json.loads(summary)
+    # 4x4 のドミノ敷き詰め 36 通りは、正方形の回転・反転で 9 通りにまとまる
+    assert summary["異なる解"] == 9
+    assert sum(s["回数"] for s in summary["解の一覧"]) == 36
+    assert grid == summary["解の一覧"][0]["盤面"]
+    _, _, summary = solve(board_grid, [[[1, 1]]], [1], [8], 0, engine="exact", max_solutions=100, symmetric=False)
+    assert json.loads(summary)["異なる解"] == 36
+    _, _, summary = solve(board_grid, [[[1, 1]]], [1], [8], 0, engine="exact", max_solutions=4)
+    assert json.loads(summary)["異なる解"] == 4 and len(json.loads(summary)["解の一覧"]) == 4
+
+    # 同じ形の別のピースを入れ替えただけの配置は同じ解
+    square = [[0, 0], [0, 0]]
+    _, _, summary = solve(square, [[[1, 1]], [[1], [1]]], [1, 2], [1, 1], 0, engine="exact",
+                          max_solutions=10, symmetric=False)
+    assert json.loads(summary)["異なる解"] == 2
+
+    # 焼きなましで集めた解も同じようにまとめる
+    _, _, summary = solve(board_grid, [[[1, 1]]], [1], [8], 100, seed=0, max_solutions=100)
+    summary = json.loads(summary)
+    assert 1 <= summary["異なる解"] <= 9
+    assert sum(s["回数"] for s in summary["解の一覧"]) == summary["成功"]
+
+    # 壁で分かれた盤面は、つなぎ合わせた後に盤面全体の対称性でまとめる
+    _, _, summary = solve_regions([[0, 0, None, 0, 0], [0, 0, None, 0, 0]], [[[1, 1]]], [1], [4], 0,
+                                  engine="exact", max_solutions=10)
+    summary = json.loads(summary)
+    assert summary["異なる解"] == 3
+    assert sorted(s["回数"] for s in summary["解の一覧"]) == [1, 1, 2]
+
+
+def test_warm_start_maps_previous_result_onto_new_placements():
+    _, previous, _ = solve([[0] * 4 for _ in range(2)], [[[1, 1]]], [1], [4], 0, engine="exact")
+
+    # 列を1つ足しても前回の配置はすべて残る
+    wider = [[0] * 5 for _ in range(2)]
+    solver = Solver(wider, [[[1, 1]]], [1], [5])
+    state, kept, dropped = solver.initial_state_from_grid(previous)
+    assert (kept, dropped) == (4, 0)
+    assert sorted(tuple(sorted(solver.placements[p].cells)) for p in np.flatnonzero(state)) == sorted(
+        tuple(sorted((r, c) for r, row in enumerate(previous) for c, cell in enumerate(row) if cell == name))
+        for name in {cell for row in previous for cell in row}
+    )
+    for sampler in ("neal", "exact_cover"):
+        solver.run(5, seed=0, sampler=sampler, initial_state=state)
+        assert solver.results[-1][0] == "成功"
+
+    # 壁にしたセルに掛かる配置は捨てる
+    walled = [[None, 0, 0, 0], [0, 0, 0, 0]]
+    solver = Solver(walled, [[[1, 1]]], [1], [4])
+    _, kept, dropped = solver.initial_state_from_grid(previous)
+    assert (kept, dropped) == (3, 1)
+
+    _, _, summary = solve(wider, [[[1, 1]]], [1], [5], 5, seed=0, previous=previous)
+    assert json.loads(summary)["前回から引き継いだ配置"] == 4
+
+    # 前回の配置をほとんど引き継げない盤面では、短い焼きなましにせず通常どおり解く
+    board_grid, pieces, limits = generate_instance(1, 6, 6)
+    piece_ids = list(range(1, len(pieces) + 1))
+    _, _, cold = solve(board_grid, pieces, piece_ids, limits, 20, seed=0, early_stop=False)
+    _, _, fallback = solve(board_grid, pieces, piece_ids, limits, 20, seed=0, early_stop=False, previous=previous)
+    cold, fallback = json.loads(cold), json.loads(fallback)
+    assert fallback["前回の結果を使わなかった"] == 1
+    assert {k: fallback.get(k) for k in cold} == cold
+
+
+def test_incidence_is_consistent():
+    board_grid = [[0, 0, 0, 0], [0, None, None, 0], [0, None, 0, 0], [0, 0, 0, 0]]
+    pieces = [[[1, 1]], [[1, 1, 1, 1], [0, 1, 0, 0]], [[1, 1, 1], [0, 0, 1]], [[1, 1, 1], [0, 0, 1], [0, 0, 1]]]
+    solver = Solver(board_grid, pieces, [1, 2, 3, 4], [2, 1, 1, 1])
+    incidence = solver.incidence
 
-    for r in solver.results:
-        if r[0] == "成功":
-            print(r)
-            break
+    for p, v in enumerate(solver.placements):
+        assert sorted(incidence.cells_of(p)) == sorted(solver.cell_index[cell] for cell in v.cells)
+    for cell, j in solver.cell_index.items():
+        expected = [p for p, v in enumerate(solver.placements) if cell in v.cells]
+        assert list(incidence.placements_of(j)) == expected
 
 
 if __name__ == "__main__":